@@ -1,22 +1,33 @@
+import asyncio
+import os
 import requests
 import time
 import json
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
+import fastJson
+import metrics
+from arenaClient import ARENABOOK_API, ArenaClient, get_client
+from rateLimiter import TokenBucket, is_retryable, is_throttled, parse_retry_after
+from snapshotDiff import CHANGE_LOG_FILE, append_changes, apply_changes, current_snapshot, diff_snapshots, has_changes
+from userRecord import UserRecord
 
-def fetch_user_data(base_url: str, batch_size: int = 50, total_users: int = 10000, rate_limit_delay: float = 0.5) -> List[Dict]:
+def iter_user_pages(base_url: str, batch_size: int = 50, total_users: int = 10000, rate_limit_delay: float = 0.5,
+                    client: Optional[ArenaClient] = None) -> Iterator[List[Dict]]:
     """
-    Fetches user data from the API with pagination handling and rate limiting.
+    Yields pages of user data as they arrive, with pagination handling and rate limiting.
     
     Args:
         base_url (str): Base URL of the API endpoint
         batch_size (int): Number of users per request (default 15 as per API)
         total_users (int): Total number of users to fetch
         rate_limit_delay (float): Delay between requests in seconds
+        client (Optional[ArenaClient]): HTTP client to use (default: the shared client with the HTTP cache)
     
-    Returns:
-        List[Dict]: List of user data dictionaries
+    Yields:
+        List[Dict]: One page of user data dictionaries; pages add up to at most total_users users
     """
-    all_users = []
+    client = client or get_client(cached=True)
+    users_so_far = 0
     num_batches = (total_users + batch_size - 1) // batch_size
     
     for batch in range(num_batches):
@@ -27,21 +38,23 @@ def fetch_user_data(base_url: str, batch_size: int = 50, total_users: int = 1000
             url = f"{base_url}&offset={offset}"
             
             # Make request with proper error handling
-            response = requests.get(url)
+            response = client.get(url)
             response.raise_for_status()
             
             # Parse response
-            batch_data = response.json()
+            with metrics.timer("arena_json_decode_seconds", endpoint="user_summary"):
+                batch_data = fastJson.response_json(response)
             
-            # Add users from this batch
+            # Hand over users from this batch
             if isinstance(batch_data, list):
-                all_users.extend(batch_data)
+                batch_data = batch_data[:total_users - users_so_far]  # Trim to exact number requested
+                users_so_far += len(batch_data)
+                yield batch_data
             else:
                 print(f"Warning: Unexpected response format at offset {offset}")
                 continue
                 
             # Progress update
-            users_so_far = len(all_users)
             print(f"Fetched {users_so_far} users out of {total_users}")
             
             # Stop if we've reached the target number
@@ -49,51 +62,326 @@ def fetch_user_data(base_url: str, batch_size: int = 50, total_users: int = 1000
                 break
                 
             # Rate limiting
-            time.sleep(rate_limit_delay)
+            with metrics.timer("arena_ratelimit_wait_seconds", limiter="fixed_delay"):
+                time.sleep(rate_limit_delay)
             
         except requests.exceptions.RequestException as e:
             print(f"Error fetching batch at offset {offset}: {str(e)}")
-            time.sleep(2)
+            with metrics.timer("arena_ratelimit_wait_seconds", limiter="error_backoff"):
+                time.sleep(2)
             continue
             
         except json.JSONDecodeError as e:
             print(f"Error parsing response at offset {offset}: {str(e)}")
             continue
+
+def fetch_user_data(base_url: str, batch_size: int = 50, total_users: int = 10000, rate_limit_delay: float = 0.5,
+                    client: Optional[ArenaClient] = None) -> List[UserRecord]:
+    """
+    Fetches user data from the API with pagination handling and rate limiting.
+    
+    Args:
+        base_url (str): Base URL of the API endpoint
+        batch_size (int): Number of users per request (default 15 as per API)
+        total_users (int): Total number of users to fetch
+        rate_limit_delay (float): Delay between requests in seconds
+        client (Optional[ArenaClient]): HTTP client to use (default: the shared client with the HTTP cache)
     
+    Returns:
+        List[UserRecord]: List of users, held as compact records (see userRecord)
+    """
+    all_users = []
+    for page in iter_user_pages(base_url, batch_size, total_users, rate_limit_delay, client):
+        all_users.extend(UserRecord.from_dict(user) for user in page)
+    return all_users
+
+def keyset_filter(last_price: Optional[float], last_id, key_field: str = "id") -> str:
+    """
+    Builds the PostgREST filter selecting rows after (last_price, last_id) in
+    order=last_price.desc.nullslast,{key_field}.desc.
+
+    Args:
+        last_price (Optional[float]): Price of the last row of the previous page
+        last_id: Tie-breaker key of the last row of the previous page
+        key_field (str): Unique column used to break price ties
+
+    Returns:
+        str: Query string fragment to append to the URL
+    """
+    if last_price is None:
+        # Already in the null-priced tail, which is ordered by key alone
+        return f"last_price=is.null&{key_field}=lt.{last_id}"
+    return (f"or=(last_price.lt.{last_price},last_price.is.null,"
+            f"and(last_price.eq.{last_price},{key_field}.lt.{last_id}))")
+
+def fetch_user_data_keyset(base_url: str, batch_size: int = 50, total_users: int = 10000, rate_limit_delay: float = 0.5,
+                           key_field: str = "id", max_errors: int = 10,
+                           client: Optional[ArenaClient] = None) -> List[UserRecord]:
+    """
+    Fetches user data page by page with a (last_price, id) cursor instead of an offset.
+
+    Each page starts right after the last row of the previous one, so the
+    server never has to skip over deep offsets and users whose price moves
+    mid-crawl can't shift whole pages. Users seen twice are dropped, and the
+    crawl stops at the first short page.
+
+    Args:
+        base_url (str): Endpoint URL with limit and order=last_price.desc.nullslast,{key_field}.desc
+        batch_size (int): Number of users per request (must match the URL's limit)
+        total_users (int): Maximum number of users to fetch
+        rate_limit_delay (float): Delay between requests in seconds
+        key_field (str): Unique column used to break price ties
+        max_errors (int): Failed requests tolerated before giving up
+        client (Optional[ArenaClient]): HTTP client to use (default: the shared client with the HTTP cache)
+
+    Returns:
+        List[UserRecord]: List of users in price order
+    """
+    client = client or get_client(cached=True)
+    all_users = []
+    seen_handles = set()
+    cursor = None
+    errors = 0
+
+    while len(all_users) < total_users and errors <= max_errors:
+        url = base_url if cursor is None else f"{base_url}&{keyset_filter(*cursor, key_field)}"
+
+        try:
+            response = client.get(url)
+            response.raise_for_status()
+            with metrics.timer("arena_json_decode_seconds", endpoint="user_summary"):
+                batch_data = fastJson.response_json(response)
+        except requests.exceptions.RequestException as e:
+            errors += 1
+            print(f"Error fetching batch after {cursor}: {str(e)}")
+            with metrics.timer("arena_ratelimit_wait_seconds", limiter="error_backoff"):
+                time.sleep(2)
+            continue
+        except json.JSONDecodeError as e:
+            errors += 1
+            print(f"Error parsing response after {cursor}: {str(e)}")
+            continue
+
+        if not isinstance(batch_data, list):
+            print(f"Warning: Unexpected response format after {cursor}")
+            break
+
+        for user in batch_data:
+            handle = user.get("twitter_handle")
+            if handle in seen_handles:
+                continue
+            if handle:
+                seen_handles.add(handle)
+            all_users.append(UserRecord.from_dict(user))
+        print(f"Fetched {len(all_users)} users out of {total_users}")
+
+        # A short page means the end of the table
+        if len(batch_data) < batch_size:
+            break
+        last = batch_data[-1]
+        cursor = (last.get("last_price"), last.get(key_field))
+
+        # Rate limiting
+        with metrics.timer("arena_ratelimit_wait_seconds", limiter="fixed_delay"):
+            time.sleep(rate_limit_delay)
+
+    if errors > max_errors:
+        print(f"Giving up after {max_errors} failed requests")
+    return all_users[:total_users]  # Trim to exact number requested
+
+async def fetch_user_data_async(base_url: str, batch_size: int = 50, total_users: int = 10000,
+                                concurrency: int = 8, rate: float = 4.0, max_retries: int = 5) -> List[UserRecord]:
+    """
+    Fetches user data with several offset windows in flight at once.
+
+    Requests share one pooled client and are paced by an adaptive token bucket
+    that slows down on 429/503 responses and honours Retry-After headers.
+
+    Args:
+        base_url (str): Base URL of the API endpoint
+        batch_size (int): Number of users per request
+        total_users (int): Total number of users to fetch
+        concurrency (int): Maximum number of pages requested at the same time
+        rate (float): Initial (and maximum) number of requests per second
+        max_retries (int): Retries per page after throttling or connection errors
+
+    Returns:
+        List[UserRecord]: List of users, in the same order as fetch_user_data
+    """
+    num_batches = (total_users + batch_size - 1) // batch_size
+    limiter = TokenBucket(rate, capacity=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    pages: Dict[int, List[UserRecord]] = {}
+    fetched = 0
+
+    async def fetch_page(client: ArenaClient, offset: int) -> None:
+        nonlocal fetched
+        url = f"{base_url}&offset={offset}"
+
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                await limiter.acquire_async()
+
+                try:
+                    response = await asyncio.to_thread(client.get, url)
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching batch at offset {offset}: {str(e)}")
+                    limiter.on_throttle()
+                    continue
+
+                # Back off and retry when the server is throttling; retry server errors at the same rate
+                if is_retryable(response):
+                    if is_throttled(response):
+                        print(f"Throttled at offset {offset} (HTTP {response.status_code}), retrying...")
+                        limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                    else:
+                        print(f"Server error at offset {offset} (HTTP {response.status_code}), retrying...")
+                        limiter.on_error()
+                    continue
+
+                try:
+                    response.raise_for_status()
+                    with metrics.timer("arena_json_decode_seconds", endpoint="user_summary"):
+                        batch_data = fastJson.response_json(response)
+                except json.JSONDecodeError as e:
+                    print(f"Error parsing response at offset {offset}: {str(e)}")
+                    return
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching batch at offset {offset}: {str(e)}")
+                    return
+
+                limiter.on_success()
+
+                if isinstance(batch_data, list):
+                    pages[offset] = [UserRecord.from_dict(user) for user in batch_data]
+                    fetched += len(batch_data)
+                    print(f"Fetched {fetched} users out of {total_users}")
+                else:
+                    print(f"Warning: Unexpected response format at offset {offset}")
+                return
+
+            print(f"Giving up on batch at offset {offset} after {max_retries} retries")
+
+    with ArenaClient(pool_size=concurrency, cache=True) as client:
+        await asyncio.gather(*(fetch_page(client, batch * batch_size) for batch in range(num_batches)))
+
+    # Reassemble pages in offset order so the result matches the sequential pager
+    all_users = [user for offset in sorted(pages) for user in pages[offset]]
     return all_users[:total_users]  # Trim to exact number requested
 
-def save_user_data(users: List[Dict], output_file: str = "user_data.json") -> None:
+def save_user_data(users: List[Dict], output_file: str = "user_data.json", columnar_dir: Optional[str] = None) -> None:
     """
     Saves the collected user data to a JSON file.
     
     Args:
-        users (List[Dict]): List of user data dictionaries
+        users (List[Dict]): List of users (dictionaries or UserRecords)
         output_file (str): Output file path
+        columnar_dir (Optional[str]): Also write a columnar snapshot (see columnarStore) to this directory
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump({
-            "total_users": len(users),
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "users": users
-        }, f, indent=2, ensure_ascii=False)
+    header = {
+        "total_users": len(users),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with metrics.timer("arena_checkpoint_seconds", kind="snapshot"):
+        with open(output_file, 'w', encoding='utf-8') as f:
+            fastJson.dump({**header, "users": users}, f)
     print(f"Saved {len(users)} users to {output_file}")
+    
+    if columnar_dir:
+        # NumPy is only needed for the optional columnar format
+        from columnarStore import save_columns
+        save_columns(users, columnar_dir, header)
+        print(f"Saved {len(users)} users to {columnar_dir}")
+
+def save_user_changes(users: List[Dict], output_file: str = "user_data.json", log_file: str = CHANGE_LOG_FILE,
+                      columnar_dir: Optional[str] = None) -> bool:
+    """
+    Saves only what changed since the previous snapshot to a change log.
+    
+    The previous snapshot is output_file with every logged change replayed on
+    top. Once the log grows larger than the base file, both are folded into a
+    fresh base snapshot. The columnar snapshot is rewritten on every change,
+    so readers that prefer it never see a stale crawl.
+    
+    Args:
+        users (List[Dict]): Users from the new crawl (dictionaries or UserRecords)
+        output_file (str): Base snapshot file path
+        log_file (str): Change log file path
+        columnar_dir (Optional[str]): Columnar snapshot directory, kept equal to the current snapshot
+    
+    Returns:
+        bool: False if there is no previous snapshot to diff against
+    """
+    if not os.path.exists(output_file):
+        return False
+    
+    header, previous = current_snapshot(output_file, log_file)
+    previous = list(previous)
+    changes = diff_snapshots(previous, users)
+    current = previous
+    
+    if has_changes(changes):
+        current = apply_changes(previous, changes, make=UserRecord.from_dict)
+        header = {**header, "total_users": len(current), "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+        append_changes(changes, log_file, header["timestamp"])
+    print(f"Logged {len(changes['added'])} new, {len(changes['changed'])} changed and "
+          f"{len(changes['removed'])} dropped users to {log_file}")
+    
+    if os.path.exists(log_file) and os.path.getsize(log_file) > os.path.getsize(output_file):
+        save_user_data(users, output_file, columnar_dir)
+        os.remove(log_file)
+        print(f"Compacted {log_file} into {output_file}")
+    elif columnar_dir and (has_changes(changes) or not os.path.isdir(columnar_dir)):
+        # Same users, in the same order, as current_snapshot replays from the log
+        from columnarStore import save_columns
+        save_columns(current, columnar_dir, header)
+        print(f"Saved {len(current)} users to {columnar_dir}")
+    return True
 
-def main():
+def save_crawl(users: List[Dict], incremental: bool = True, columnar_dir: Optional[str] = None,
+               history_dir: Optional[str] = None) -> None:
+    """
+    Saves a finished crawl: the snapshot (or its changes) and the price history.
+    
+    Args:
+        users (List[Dict]): Users from the crawl (dictionaries or UserRecords)
+        incremental (bool): Log only changes against the previous snapshot instead of rewriting it
+        columnar_dir (Optional[str]): Columnar snapshot directory (see save_user_data)
+        history_dir (Optional[str]): Price history directory (see priceHistory), or None to skip it
+    """
+    if not (incremental and save_user_changes(users, columnar_dir=columnar_dir)):
+        save_user_data(users, columnar_dir=columnar_dir)
+    if history_dir:
+        from priceHistory import record_snapshot
+        record_snapshot(users, history_dir)
+
+def main(total_users: int = 10000, concurrency: int = 8, keyset: bool = False, incremental: bool = True):
     # API configuration
-    BASE_URL = "https://api.arenabook.xyz/user_summary?&limit=50&order=last_price.desc.nullslast"
-    TOTAL_USERS = 10000
+    BASE_URL = f"{ARENABOOK_API}/user_summary?&limit=50&order=last_price.desc.nullslast"
+    TOTAL_USERS = total_users
     BATCH_SIZE = 50
+    KEYSET_URL = f"{ARENABOOK_API}/user_summary?&limit=50&order=last_price.desc.nullslast,id.desc"
+    CONCURRENCY = concurrency  # Pages in flight at once; set to 1 to use the sequential pager
+    KEYSET = keyset  # Page by a (last_price, id) cursor: consistent deep crawls, but one page at a time
+    COLUMNAR_DIR = "user_data.columns"  # Set to None to only write JSON
+    INCREMENTAL = incremental  # Log only changes against the previous snapshot instead of rewriting it
+    HISTORY_DIR = "price_history"  # Append every crawl's prices to the price history; set to None to skip
     
     # Fetch data
     print(f"Starting data collection for {TOTAL_USERS} users...")
-    users = fetch_user_data(BASE_URL, BATCH_SIZE, TOTAL_USERS)
+    if KEYSET:
+        users = fetch_user_data_keyset(KEYSET_URL, BATCH_SIZE, TOTAL_USERS)
+    elif CONCURRENCY > 1:
+        users = asyncio.run(fetch_user_data_async(BASE_URL, BATCH_SIZE, TOTAL_USERS, concurrency=CONCURRENCY))
+    else:
+        users = fetch_user_data(BASE_URL, BATCH_SIZE, TOTAL_USERS)
     
     # Save data
     if users:
-        save_user_data(users)
+        save_crawl(users, INCREMENTAL, COLUMNAR_DIR, HISTORY_DIR)
         print("Data collection completed successfully")
     else:
         print("No data collected")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    metrics.run_instrumented(main)
\ No newline at end of file
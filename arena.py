@@ -0,0 +1,135 @@
+"""
+Single entry point for the Arena scripts.
+
+    python arena.py scrape      # ArenaScrap.py: top accounts -> user_data.json
+    python arena.py enrich      # fetchBday.py: add createdOn -> user_data_with_createdOn.json
+    python arena.py refetch     # refetchForCreatedOnNull.py: retry null createdOn -> newFinal.json
+    python arena.py birthdays   # getBirthday.py: birthdays_by_day.csv
+    python arena.py plot        # bubbleMapForBirthday.py: birthday chart
+    python arena.py lookup ...  # birthdayIndex.py: whose birthday is it
+    python arena.py history ... # priceHistory.py: prices over time
+    python arena.py pipeline    # pipeline.py: scrape, enrich and birthdays in one streaming run
+
+Each subcommand imports its script only when it runs, so --help and the
+offline commands never load requests, dotenv or matplotlib. Subcommands
+honour ARENA_METRICS and ARENA_PROFILE (see metrics.py).
+"""
+import argparse
+import sys
+
+
+def scrape(args):
+    import ArenaScrap
+    return ArenaScrap.main(args.total_users, args.concurrency, args.keyset, not args.full)
+
+
+def enrich(args):
+    import fetchBday
+    return fetchBday.main(args.workers, args.rate, args.priority, args.time_budget, args.max_requests)
+
+
+def refetch(args):
+    import refetchForCreatedOnNull
+    return refetchForCreatedOnNull.main(args.rate)
+
+
+def birthdays(args):
+    import getBirthday
+    return getBirthday.main(args.output)
+
+
+def plot(args):
+    import bubbleMapForBirthday
+    return bubbleMapForBirthday.chart(args.output, args.force)
+
+
+def chart_file(path):
+    """--output for plot: a file whose extension the chart can be rendered to"""
+    # bubbleMapForBirthday only loads matplotlib when it draws
+    import bubbleMapForBirthday
+    try:
+        bubbleMapForBirthday.render_format(path)
+    except ValueError as e:
+        # argparse reports this through the plot parser's error()
+        raise argparse.ArgumentTypeError(str(e))
+    return path
+
+
+def lookup(args):
+    import birthdayIndex
+    sys.argv = ["birthdayIndex.py", *args.query]
+    return birthdayIndex.main()
+
+
+def history(args):
+    import priceHistory
+    sys.argv = ["priceHistory.py", *args.query]
+    return priceHistory.main()
+
+
+def run_pipeline(args):
+    import pipeline
+    return pipeline.main(args.total_users, args.workers, args.rate, args.page_delay, args.output, args.checkpoint_every)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="arena", description="Scrape arena.social accounts and analyse their birthdays")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    command = commands.add_parser("scrape", help="Fetch the top accounts into user_data.json")
+    command.add_argument("--total-users", type=int, default=10000, help="Number of accounts to fetch")
+    command.add_argument("--concurrency", type=int, default=8, help="Pages in flight at once (1 for the sequential pager)")
+    command.add_argument("--keyset", action="store_true", help="Page by a (last_price, id) cursor instead of offsets")
+    command.add_argument("--full", action="store_true", help="Rewrite user_data.json instead of logging changes")
+    command.set_defaults(run=scrape)
+
+    command = commands.add_parser("enrich", help="Fetch createdOn for every account (one shard per token in AUTH_TOKENS)")
+    command.add_argument("--workers", type=int, default=8, help="Handles looked up concurrently")
+    command.add_argument("--rate", type=float, default=4.0, help="Maximum requests per second (per shard)")
+    command.add_argument("--priority", default="last_price", help="Numeric user field; highest values are enriched first")
+    command.add_argument("--time-budget", type=float, help="Stop starting lookups after this many seconds")
+    command.add_argument("--max-requests", type=int, help="Stop starting lookups after this many API requests")
+    command.set_defaults(run=enrich)
+
+    command = commands.add_parser("refetch", help="Retry accounts whose createdOn is still null")
+    command.add_argument("--rate", type=float, default=1.0, help="Maximum requests per second")
+    command.set_defaults(run=refetch)
+
+    command = commands.add_parser("birthdays", help="Write the birthdays-by-day CSV")
+    command.add_argument("--output", default="birthdays_by_day.csv", help="CSV file to write")
+    command.set_defaults(run=birthdays)
+
+    command = commands.add_parser("plot", help="Chart birthdays by day (window, or a file with --output)")
+    command.add_argument("--output", type=chart_file, help="Render headlessly to this .png, .svg or .html file")
+    command.add_argument("--force", action="store_true", help="Redraw even if the snapshot hasn't changed")
+    command.set_defaults(run=plot)
+
+    command = commands.add_parser("lookup", help="Query the birthday index (today, day, range, months)")
+    command.add_argument("query", nargs=argparse.REMAINDER, help="Arguments for birthdayIndex.py, e.g. today --top 10")
+    command.set_defaults(run=lookup)
+
+    command = commands.add_parser("history", help="Query the price history (series, top, rebuild)")
+    command.add_argument("query", nargs=argparse.REMAINDER, help="Arguments for priceHistory.py, e.g. top --at 2025-01-02")
+    command.set_defaults(run=history)
+
+    command = commands.add_parser("pipeline", help="Scrape, enrich and write the birthdays CSV in one streaming run")
+    command.add_argument("--total-users", type=int, default=10000, help="Number of accounts to fetch")
+    command.add_argument("--workers", type=int, default=8, help="Handles looked up concurrently")
+    command.add_argument("--rate", type=float, default=4.0, help="Maximum createdOn lookups per second")
+    command.add_argument("--page-delay", type=float, default=0.5, help="Seconds between user_summary pages")
+    command.add_argument("--output", default="birthdays_by_day.csv", help="Birthdays CSV to write")
+    command.add_argument("--checkpoint-every", type=float, default=60.0, help="Seconds between CSV checkpoints")
+    command.set_defaults(run=run_pipeline)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # metrics is light; it only pulls in the profilers when they are enabled
+    import metrics
+    return metrics.run_instrumented(lambda: args.run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import time
+from typing import Dict, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+
+import metrics
+from cacheStore import ProcessWide
+from httpCache import CachedResponse, HttpCache, get_cache
+
+# API hosts; overridable so the scripts can be pointed at a local stand-in
+ARENABOOK_API = os.getenv("ARENABOOK_API_URL", "https://api.arenabook.xyz")
+STARSARENA_API = os.getenv("STARSARENA_API_URL", "https://api.starsarena.com")
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+# Callables invoked with every response received by any client, e.g. to record latency
+RESPONSE_HOOKS = []
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+
+
+def auth_headers(auth_token: str, referer: str = "https://arena.social/") -> Dict[str, str]:
+    """
+    Builds the headers for an authenticated Arena API request.
+
+    Args:
+        auth_token (str): Bearer token
+        referer (str): Referer the API expects for the calling page
+
+    Returns:
+        Dict[str, str]: Request headers
+    """
+    return {
+        "Authorization": f"Bearer {auth_token}",
+        "Content-Type": "application/json",
+        "Referer": referer,
+    }
+
+
+def _run_response_hooks(response: requests.Response, *args, **kwargs) -> None:
+    for hook in RESPONSE_HOOKS:
+        hook(response)
+
+
+class ArenaClient:
+    """
+    Pooled HTTP client shared by every script that talks to the Arena APIs.
+
+    Connections are kept alive and reused per host, responses are requested
+    gzip-compressed and every request gets a default timeout. Clients
+    created with cache=True send GETs through an HTTP cache (see httpCache)
+    and revalidate them with conditional requests; the read-only crawl and
+    lookup paths opt in, other clients always go to the server.
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 cache: Union[HttpCache, bool, None] = False):
+        """
+        Args:
+            pool_size (int): Maximum number of open connections per host
+            timeout: Default (connect, read) timeout for every request
+            cache: HttpCache for GET responses; True for the shared on-disk cache, None/False (default) for none
+        """
+        self.timeout = timeout
+        self.cache = get_cache() if cache is True else cache or None
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": USER_AGENT,
+        })
+        # pool_block caps concurrent connections per host at pool_size
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.hooks["response"].append(_run_response_hooks)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = urlsplit(url).path.strip("/") or "/"
+        if method == "GET" and self.cache is not None:
+            return self._cached_get(endpoint, url, **kwargs)
+        return self._send(endpoint, method, url, **kwargs)
+
+    def _cached_get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        key = self.cache.key(url, {**self.session.headers, **(kwargs.get("headers") or {})})
+        entry = self.cache.get(key)
+        if entry is not None:
+            if self.cache.is_fresh(endpoint, entry):
+                metrics.inc("arena_http_cache_total", endpoint=endpoint, result="fresh")
+                self.cache.touch(key)
+                return CachedResponse(url, entry)
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **self.cache.conditional_headers(entry)}
+
+        response = self._send(endpoint, "GET", url, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            metrics.inc("arena_http_cache_total", endpoint=endpoint, result="revalidated")
+            self.cache.revalidated(key, entry)
+            return CachedResponse(url, entry)
+        if self.cache.storable(endpoint, response):
+            metrics.inc("arena_http_cache_total", endpoint=endpoint, result="miss")
+            self.cache.put(key, response)
+        return response
+
+    def _send(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            metrics.observe("arena_http_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+            metrics.inc("arena_http_requests_total", endpoint=endpoint, status=status)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "ArenaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_default_client = ProcessWide(ArenaClient)
+_cached_client = ProcessWide(lambda: ArenaClient(cache=True))
+
+
+def get_client(cached: bool = False) -> ArenaClient:
+    """Returns the process-wide client, creating it on first use; cached=True for the one using the HTTP cache"""
+    return (_cached_client if cached else _default_client).get()
@@ -1,22 +1,17 @@
-import requests
 import time
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from arenaClient import STARSARENA_API, auth_headers, get_client
 load_dotenv()
 
 AERNA_ACTIVITY_AUTH_TOKEN = os.getenv("AERNA_ACTIVITY_AUTH_TOKEN")
 def repost_thread(thread_id: str, auth_token: str) -> bool:
     """Make a repost request"""
-    headers = {
-        'Authorization': f'Bearer {auth_token}',
-        'Content-Type': 'application/json',
-        'Referer': 'https://starsarena.com/',
-        'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-    }
+    headers = auth_headers(auth_token, referer='https://starsarena.com/')
     
-    response = requests.post(
-        'https://api.starsarena.com/threads/repost',
+    response = get_client().post(
+        f'{STARSARENA_API}/threads/repost',
         headers=headers,
         json={"threadId": thread_id}
     )
@@ -26,15 +21,10 @@ def repost_thread(thread_id: str, auth_token: str) -> bool:
 
 def undo_repost(thread_id: str, auth_token: str) -> bool:
     """Undo a repost"""
-    headers = {
-        'Authorization': f'Bearer {auth_token}',
-        'Content-Type': 'application/json',
-        'Referer': 'https://starsarena.com/',
-                'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-    }
+    headers = auth_headers(auth_token, referer='https://starsarena.com/')
     
-    response = requests.delete(
-        f'https://api.starsarena.com/threads/repost?threadId={thread_id}',
+    response = get_client().delete(
+        f'{STARSARENA_API}/threads/repost?threadId={thread_id}',
         headers=headers
     )
     return response.status_code == 200
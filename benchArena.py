@@ -0,0 +1,366 @@
+"""
+Offline benchmark for the scrapers against a local stand-in for the Arena APIs.
+
+The mock server serves user_summary pages and user/handle lookups built from
+birthdays_by_day.csv, with configurable latency, error rate and 429 bursts.
+Each scenario runs one of the real pipeline functions against it and reports
+requests/sec, p50/p99 latency and wall time.
+
+Usage:
+    python benchArena.py --latency 50 --error-rate 0.01 --save baseline.json
+    python benchArena.py --latency 50 --error-rate 0.01 --baseline baseline.json
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCENARIOS = ["scrape", "scrape-rerun", "scrape-async", "scrape-keyset", "enrich", "refetch", "batch", "pipeline"]
+
+# Keyset cursors sent by ArenaScrap.keyset_filter
+KEYSET_AFTER = re.compile(r"^\(last_price\.lt\.([^,]+),last_price\.is\.null,and\(last_price\.eq\.[^,]+,id\.lt\.([^)]+)\)\)$")
+
+
+def load_fixtures(csv_file="birthdays_by_day.csv"):
+    """Build mock users (ordered by last_price desc) from the birthdays CSV"""
+    from birthdayCsv import read_birthdays_csv
+
+    users = []
+    for day_users in read_birthdays_csv(csv_file).values():
+        for user in day_users:
+            try:
+                # Keep integer prices as ints, like the real API's JSON
+                price = float(user["last_price"])
+                price = int(price) if user["last_price"].lstrip("-").isdigit() else price
+            except ValueError:
+                price = None
+            users.append({
+                "twitter_handle": user["twitter_handle"],
+                "twitter_username": user["twitter_username"],
+                "last_price": price,
+                "createdOn": user["createdOn"] or None,
+            })
+    users.sort(key=lambda user: -(user["last_price"] or 0))
+    # Ids descend along the list, matching order=last_price.desc.nullslast,id.desc
+    for index, user in enumerate(users):
+        user["id"] = len(users) - index
+    return users
+
+
+class MockArenaServer:
+    """Threaded HTTP server standing in for api.arenabook.xyz and api.starsarena.com"""
+
+    def __init__(self, users, latency=0.0, jitter=0.0, error_rate=0.0, burst_every=0.0, burst_length=0.0, seed=0):
+        """
+        Args:
+            users: Fixture users served by both endpoints
+            latency: Base response delay in seconds
+            jitter: Extra uniformly distributed delay in seconds
+            error_rate: Fraction of requests answered with HTTP 500
+            burst_every: Seconds between 429 bursts (0 disables them)
+            burst_length: Seconds each 429 burst lasts
+            seed: Seed for the latency and error randomness
+        """
+        self.users = users
+        self.by_handle = {user["twitter_handle"]: user for user in users}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body, headers = mock.respond(self.path)
+                payload = json.dumps(body).encode('utf-8')
+                if status == 200:
+                    headers = {**headers, "ETag": f'"{hashlib.md5(payload).hexdigest()}"'}
+                    if self.headers.get("If-None-Match") == headers["ETag"]:
+                        status, payload = 304, b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def respond(self, path):
+        """Return (status, body, headers) for a request path"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        time.sleep(delay)
+
+        if self.burst_every and (time.monotonic() - self._started) % self.burst_every < self.burst_length:
+            return 429, {"message": "Too Many Requests"}, {"Retry-After": "1"}
+        if failed:
+            return 500, {"message": "Internal Server Error"}, {}
+
+        parsed = urllib.parse.urlparse(path)
+        query = urllib.parse.parse_qs(parsed.query)
+        if parsed.path == "/user_summary":
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["50"])[0])
+            users = self.users
+            if "or" in query or "last_price" in query:
+                after = KEYSET_AFTER.match(query["or"][0]) if "or" in query else None
+                if after:
+                    cursor = (0, -float(after.group(1)), -int(after.group(2)))
+                else:
+                    cursor = (1, 0, -int(query["id"][0].split(".", 1)[1]))
+                users = [user for user in users if self._order_key(user) > cursor]
+            page = users[offset:offset + limit]
+            return 200, [{key: value for key, value in user.items() if key != "createdOn"} for user in page], {}
+        if parsed.path == "/user/handle":
+            user = self.by_handle.get(query.get("handle", [""])[0])
+            if user is None:
+                return 404, {"message": "User not found"}, {}
+            return 200, {"user": {"twitter_handle": user["twitter_handle"], "createdOn": user["createdOn"]}}, {}
+        return 404, {"message": "Not found"}, {}
+
+    @staticmethod
+    def _order_key(user):
+        price = user["last_price"]
+        return (price is None, -(price or 0), -user["id"])
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LatencyRecorder:
+    """Collects client-side latency and status of every API response"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, response):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+            if response.status_code >= 400:
+                self.errors += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(name, server, args):
+    """Run one pipeline step against the mock server in a scratch directory"""
+    import arenaClient
+    import handleCache
+    import httpCache
+
+    recorder = LatencyRecorder()
+    arenaClient.RESPONSE_HOOKS.append(recorder)
+    # Each scenario starts with empty handle and HTTP caches, and clients using the new ones
+    for shared in (handleCache._default_cache, httpCache._default_cache,
+                   arenaClient._default_client, arenaClient._cached_client):
+        shared.reset()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                wall = _run(name, server, args)
+        finally:
+            os.chdir(cwd)
+            arenaClient.RESPONSE_HOOKS.remove(recorder)
+            for shared in (handleCache._default_cache, arenaClient._default_client,
+                           arenaClient._cached_client, httpCache._default_cache):
+                shared.reset()
+
+    requests_made = len(recorder.latencies)
+    return {
+        "scenario": name,
+        "requests": requests_made,
+        "errors": recorder.errors,
+        "wall_s": wall,
+        "rps": requests_made / wall if wall else 0.0,
+        "p50_ms": percentile(recorder.latencies, 0.50) * 1000,
+        "p99_ms": percentile(recorder.latencies, 0.99) * 1000,
+    }
+
+
+def _save_snapshot(users, filename):
+    from ArenaScrap import save_user_data
+    save_user_data(users, filename)
+
+
+def _run(name, server, args):
+    import asyncio
+    import ArenaScrap
+    import fetchBday
+    import getBirthday
+    import pipeline
+    import refetchForCreatedOnNull
+
+    users = server.users
+    base_url = f"{server.url}/user_summary?&limit=50&order=last_price.desc.nullslast"
+    summary = [{key: value for key, value in user.items() if key != "createdOn"} for user in users]
+
+    if name == "scrape":
+        start = time.perf_counter()
+        ArenaScrap.fetch_user_data(base_url, 50, len(users), rate_limit_delay=args.delay)
+        return time.perf_counter() - start
+
+    if name == "scrape-rerun":
+        # Second crawl of unchanged data: every page is revalidated and answered 304
+        ArenaScrap.fetch_user_data(base_url, 50, len(users), rate_limit_delay=args.delay)
+        start = time.perf_counter()
+        ArenaScrap.fetch_user_data(base_url, 50, len(users), rate_limit_delay=args.delay)
+        return time.perf_counter() - start
+
+    if name == "scrape-keyset":
+        start = time.perf_counter()
+        keyset_url = f"{server.url}/user_summary?&limit=50&order=last_price.desc.nullslast,id.desc"
+        ArenaScrap.fetch_user_data_keyset(keyset_url, 50, len(users) + 50, rate_limit_delay=args.delay)
+        return time.perf_counter() - start
+
+    if name == "scrape-async":
+        start = time.perf_counter()
+        asyncio.run(ArenaScrap.fetch_user_data_async(base_url, 50, len(users), concurrency=args.workers, rate=args.rate))
+        return time.perf_counter() - start
+
+    if name == "enrich":
+        _save_snapshot(summary, "user_data.json")
+        start = time.perf_counter()
+        fetchBday.process_users(workers=args.workers, rate=args.rate)
+        return time.perf_counter() - start
+
+    if name == "refetch":
+        # Every tenth user is missing its createdOn
+        enriched = [{**user, "createdOn": None if index % 10 == 0 else user["createdOn"]} for index, user in enumerate(users)]
+        _save_snapshot(enriched, "user_data_with_createdOn.json")
+        start = time.perf_counter()
+        refetchForCreatedOnNull.process_null_createdOn_users(rate=args.rate)
+        return time.perf_counter() - start
+
+    if name == "batch":
+        # scrape, then enrich, then aggregate, each waiting for the previous step's file
+        start = time.perf_counter()
+        _save_snapshot(ArenaScrap.fetch_user_data(base_url, 50, len(users), rate_limit_delay=args.delay), "user_data.json")
+        fetchBday.process_users(workers=args.workers, rate=args.rate)
+        getBirthday.main("birthdays_by_day.csv")
+        return time.perf_counter() - start
+
+    if name == "pipeline":
+        start = time.perf_counter()
+        pipeline.run(base_url, len(users), args.workers, args.rate, args.delay, "birthdays_by_day.csv")
+        return time.perf_counter() - start
+
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def print_results(results, baseline=None):
+    baseline = {result["scenario"]: result for result in baseline or []}
+    print(f"{'scenario':<14}{'requests':>10}{'errors':>8}{'wall s':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['scenario']:<14}{result['requests']:>10}{result['errors']:>8}{result['wall_s']:>10.2f}"
+              f"{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+        previous = baseline.get(result["scenario"])
+        if previous:
+            change = (result["wall_s"] - previous["wall_s"]) / previous["wall_s"] * 100 if previous["wall_s"] else 0.0
+            print(f"{'  vs baseline':<14}{'':>18}{previous['wall_s']:>10.2f}{previous['rps']:>10.1f}"
+                  f"{previous['p50_ms']:>10.1f}{previous['p99_ms']:>10.1f}  wall {change:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Arena scrapers against a local mock API")
+    parser.add_argument("--fixtures", default="birthdays_by_day.csv", help="CSV the mock users are built from")
+    parser.add_argument("--users", type=int, default=500, help="Number of fixture users to serve (0 for all)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=20.0, help="Base server latency in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Extra random server latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="Seconds between 429 bursts (0 disables them)")
+    parser.add_argument("--burst-length", type=float, default=0.5, help="Seconds each 429 burst lasts")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrency for the async pager and enrichment pool")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second allowed by the rate limiters")
+    parser.add_argument("--delay", type=float, default=0.0, help="rate_limit_delay for the sequential pager")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --save")
+    parser.add_argument("--metrics", help="Write the scripts' metrics (see metrics.py) to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the scripts' own progress output")
+    args = parser.parse_args()
+
+    users = load_fixtures(args.fixtures)
+    if args.users:
+        users = users[:args.users]
+
+    server = MockArenaServer(
+        users,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_length=args.burst_length,
+    )
+    # The API hosts are read when arenaClient is first imported
+    os.environ["ARENABOOK_API_URL"] = server.url
+    os.environ["STARSARENA_API_URL"] = server.url
+
+    results = []
+    with server:
+        for name in args.scenarios.split(","):
+            results.append(run_scenario(name.strip(), server, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.metrics:
+        import metrics
+        metrics.REGISTRY.write(args.metrics)
+        metrics.REGISTRY.print_summary()
+        print(f"Metrics written to {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
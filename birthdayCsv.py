@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import os
+from birthdayDays import DAY_INDEX, DAY_LABELS
+
+CSV_HEADER = ["Day Index", "Day of Year", "Twitter Handle", "Twitter Username", "Last Price", "Created On"]
+USER_KEYS = ["twitter_handle", "twitter_username", "last_price", "createdOn"]
+
+
+def index_file(csv_file):
+    return f"{csv_file}.idx.json"
+
+
+def _day_number(day):
+    """Accept a bin index (0-365) or a "%B %d" label such as "March 14" """
+    return day if isinstance(day, int) else DAY_INDEX[day]
+
+
+def write_birthdays_csv(birthdays, output_file, buffer_size=1 << 20):
+    """
+    Write birthdays as one table row per user, ordered by day, plus a day index.
+
+    Rows carry the day-of-year bin and label as columns. The sidecar index
+    (see index_file) stores the byte offset where each day's rows start, so
+    read_day can seek straight to one day. Rows are rendered per day into a
+    string buffer and written through a large file buffer.
+
+    Args:
+        birthdays: Mapping of "%B %d" day label to a list of user dictionaries
+        output_file: CSV file path
+        buffer_size: Size of the output file buffer in bytes
+
+    Returns:
+        List[int]: 367 byte offsets; day d spans offsets[d]:offsets[d + 1]
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    offsets = []
+    position = 0
+
+    with open(output_file, 'wb', buffering=buffer_size) as f:
+        writer.writerow(CSV_HEADER)
+        for index, label in enumerate(DAY_LABELS):
+            chunk = buffer.getvalue().encode('utf-8')
+            f.write(chunk)
+            position += len(chunk)
+            buffer.seek(0)
+            buffer.truncate()
+            offsets.append(position)
+            for user in birthdays.get(label, ()):
+                writer.writerow([index, label, *(user[key] for key in USER_KEYS)])
+        chunk = buffer.getvalue().encode('utf-8')
+        f.write(chunk)
+        offsets.append(position + len(chunk))
+
+    _write_index(output_file, offsets)
+    return offsets
+
+
+def _write_index(csv_file, offsets):
+    with open(index_file(csv_file), 'w', encoding='utf-8') as f:
+        json.dump({"size": os.path.getsize(csv_file), "offsets": offsets}, f)
+
+
+def build_index(csv_file):
+    """Scan a tabular birthdays CSV once and write its day index
+
+    Lines are assumed to start with the day bin; a line that doesn't (the
+    continuation of a quoted field spanning lines) belongs to the row above.
+    """
+    offsets = [None] * (len(DAY_LABELS) + 1)
+    with open(csv_file, 'rb') as f:
+        position = len(f.readline())
+        current = -1
+        for line in f:
+            try:
+                day = int(line[:line.index(b",")])
+            except ValueError:
+                day = current
+            while current < day:
+                current += 1
+                offsets[current] = position
+            position += len(line)
+    for day in range(current + 1, len(offsets)):
+        offsets[day] = position
+    _write_index(csv_file, offsets)
+    return offsets
+
+
+_index_cache = {}
+
+
+def load_index(csv_file):
+    """Return the day offsets for a CSV, rebuilding the index if it is missing or stale"""
+    size = os.path.getsize(csv_file)
+    cached = _index_cache.get(csv_file)
+    if cached and cached[0] == size:
+        return cached[1]
+    try:
+        with open(index_file(csv_file), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        offsets = index["offsets"] if index.get("size") == size else None
+    except (FileNotFoundError, ValueError, KeyError):
+        offsets = None
+    if offsets is None:
+        offsets = build_index(csv_file)
+    _index_cache[csv_file] = (size, offsets)
+    return offsets
+
+
+def _parse_rows(text):
+    return [dict(zip(USER_KEYS, row[2:])) for row in csv.reader(io.StringIO(text))]
+
+
+def read_day(csv_file, day):
+    """
+    Read the users whose birthday falls on one day with a single seek.
+
+    Args:
+        csv_file: Tabular CSV written by write_birthdays_csv
+        day: Day bin (0-365) or "%B %d" label
+
+    Returns:
+        List[Dict]: Users with twitter_handle, twitter_username, last_price and createdOn (as strings)
+    """
+    offsets = load_index(csv_file)
+    number = _day_number(day)
+    with open(csv_file, 'rb') as f:
+        f.seek(offsets[number])
+        return _parse_rows(f.read(offsets[number + 1] - offsets[number]).decode('utf-8'))
+
+
+def read_days(csv_file, first_day, last_day):
+    """Read a contiguous range of days (inclusive) with one seek, as {label: users}"""
+    offsets = load_index(csv_file)
+    first, last = _day_number(first_day), _day_number(last_day)
+    birthdays = {}
+    with open(csv_file, 'rb') as f:
+        f.seek(offsets[first])
+        data = f.read(offsets[last + 1] - offsets[first])
+    for number in range(first, last + 1):
+        chunk = data[offsets[number] - offsets[first]:offsets[number + 1] - offsets[first]]
+        if chunk:
+            birthdays[DAY_LABELS[number]] = _parse_rows(chunk.decode('utf-8'))
+    return birthdays
+
+
+def read_birthdays_csv(csv_file):
+    """Load the whole table as {label: users}"""
+    return read_days(csv_file, 0, len(DAY_LABELS) - 1)
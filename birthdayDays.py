@@ -0,0 +1,192 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Day-of-year bins follow a leap-year calendar so every "%B %d" label has a
+# fixed index; February 29 is folded into March 1 and stays empty.
+DAY_LABELS = [(date(2000, 1, 1) + timedelta(days=i)).strftime("%B %d") for i in range(366)]
+DAY_INDEX = {label: index for index, label in enumerate(DAY_LABELS)}
+FEB_29 = DAY_INDEX["February 29"]
+MARCH_01 = DAY_INDEX["March 01"]
+_MONTH_START = np.array([DAY_INDEX[date(2000, month, 1).strftime("%B %d")] for month in range(1, 13)])
+_MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Layout of createdOn values returned by the API; "0" marks a digit
+_CANONICAL = "0000-00-00T00:00:00.000Z"
+_DIGIT_POSITIONS = [i for i, char in enumerate(_CANONICAL) if char == "0"]
+_FIXED_POSITIONS = [i for i, char in enumerate(_CANONICAL) if char != "0"]
+_FIXED_CODES = np.array([ord(_CANONICAL[i]) for i in _FIXED_POSITIONS], dtype=np.uint32)
+
+
+def _scalar_bin(created_on):
+    """Day bin of a single timestamp using datetime.fromisoformat, or -1 if invalid"""
+    try:
+        date_obj = datetime.fromisoformat(created_on.replace("Z", "+00:00"))
+    except ValueError:
+        return -1
+    index = DAY_INDEX[date_obj.strftime("%B %d")]
+    return MARCH_01 if index == FEB_29 else index
+
+
+def as_strings(values, none_value=""):
+    """Convert a sequence to a NumPy string array, replacing None with none_value"""
+    values = np.asarray(values, dtype=object)
+    if not len(values):
+        return np.array([], dtype=str)
+    strings = values.astype(str)
+    strings[np.equal(values, None)] = none_value
+    return strings
+
+
+def _canonical_bins(strings):
+    """
+    Day bins for timestamps in the API's "YYYY-MM-DDTHH:MM:SS.sssZ" layout.
+
+    Characters are checked and read straight from the array's code points, so
+    no per-row parsing happens. Rows in any other layout get -1.
+    """
+    bins = np.full(len(strings), -1, dtype=np.int64)
+    width = strings.dtype.itemsize // 4
+    if width < len(_CANONICAL):
+        return bins
+
+    codes = strings.view(np.uint32).reshape(len(strings), width)[:, :len(_CANONICAL)]
+    digits = codes[:, _DIGIT_POSITIONS] - ord("0")  # non-digits wrap around to large values
+    layout = (
+        (np.char.str_len(strings) == len(_CANONICAL))
+        & (codes[:, _FIXED_POSITIONS] == _FIXED_CODES).all(axis=1)
+        & (digits <= 9).all(axis=1)
+    )
+
+    def number(*positions):
+        value = np.zeros(len(strings), dtype=np.int64)
+        for position in positions:
+            value = value * 10 + digits[:, _DIGIT_POSITIONS.index(position)]
+        return value
+
+    year, month, day = number(0, 1, 2, 3), number(5, 6), number(8, 9)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_index = np.clip(month - 1, 0, 11)
+    month_days = _MONTH_DAYS[month_index] + ((month == 2) & leap)
+    valid = (
+        layout
+        & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+        & (number(11, 12) < 24) & (number(14, 15) < 60) & (number(17, 18) < 60)
+    )
+
+    bins[valid] = _MONTH_START[month_index[valid]] + day[valid] - 1
+    bins[bins == FEB_29] = MARCH_01
+    return bins
+
+
+def day_bins(created_on):
+    """
+    Parse createdOn timestamps into day-of-year bins in one vectorized pass.
+
+    Timestamps in the layout the Arena API returns are decoded together with
+    array operations; any other string falls back to fromisoformat.
+
+    Args:
+        created_on: Sequence of ISO 8601 strings, with None or "" for missing values
+
+    Returns:
+        np.ndarray: Bin index (0-365) per timestamp, or -1 where it is missing or invalid
+    """
+    strings = as_strings(created_on)
+    bins = _canonical_bins(strings)
+
+    remaining = np.flatnonzero((strings != "") & (bins == -1))
+    for index in remaining.tolist():
+        bins[index] = _scalar_bin(strings[index])
+    return bins
+
+
+def day_bins_from_ms(created_on_ms):
+    """
+    Day-of-year bins for createdOn values already parsed to epoch milliseconds (UTC).
+
+    Args:
+        created_on_ms: Sequence of epoch milliseconds, with None for missing values
+
+    Returns:
+        np.ndarray: Bin index (0-365) per value, or -1 where it is missing
+    """
+    values = np.array([-1 if ms is None else ms for ms in created_on_ms], dtype=np.int64)
+    present = np.array([ms is not None for ms in created_on_ms], dtype=bool)
+    bins = np.full(len(values), -1, dtype=np.int64)
+    if not present.any():
+        return bins
+
+    moments = values[present].astype("datetime64[ms]")
+    months = moments.astype("datetime64[M]")
+    month_index = (months - moments.astype("datetime64[Y]")).astype(np.int64)
+    day = (moments.astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+    bins[present] = _MONTH_START[month_index] + day
+    bins[bins == FEB_29] = MARCH_01
+    return bins
+
+
+def record_bins(records):
+    """Day bins for UserRecords (see userRecord), from their parsed createdOn where possible"""
+    bins = day_bins_from_ms([record.created_on_ms for record in records])
+    for position, record in enumerate(records):
+        if record.created_on_ms is None and record.created_on is not None:
+            # createdOn kept verbatim because it isn't in the API's usual layout
+            bins[position] = day_bins([record.created_on])[0]
+    return bins
+
+
+def first_occurrence(keys, mask):
+    """
+    Indices of the first row per key among rows where mask is set, in row order.
+
+    Args:
+        keys: Sequence of keys to dedupe on; None is treated as its own key
+        mask: Boolean array selecting eligible rows
+    """
+    candidates = np.flatnonzero(mask)
+    if not len(candidates):
+        return candidates
+    keys = as_strings(keys, none_value="\0None")
+    _, first = np.unique(keys[candidates], return_index=True)
+    return np.sort(candidates[first])
+
+
+def user_columns(data, fields, defaults=None):
+    """
+    Collect the given fields as lists from any supported user source.
+
+    Args:
+        data: A loaded {"users": [...]} document, an iterable of user
+            dictionaries, or columns returned by columnarStore.load_columns
+        fields: Field names to collect
+        defaults: Values used when a record lacks a field (default None)
+
+    Returns:
+        Dict[str, list]: One list per field, aligned by row
+    """
+    defaults = defaults or {}
+    if isinstance(data, dict) and "users" not in data and all(hasattr(column, "to_list") for column in data.values()):
+        rows = len(next(iter(data.values()))) if data else 0
+        columns = {}
+        for field in fields:
+            if field not in data:
+                columns[field] = [defaults.get(field)] * rows
+                continue
+            values = data[field].to_list()
+            if data[field].missing is not None and field in defaults:
+                for index in np.flatnonzero(data[field].missing).tolist():
+                    values[index] = defaults[field]
+            columns[field] = values
+        return columns
+
+    users = data.get("users", []) if isinstance(data, dict) else data
+    if isinstance(users, list):
+        return {field: [user.get(field, defaults.get(field)) for user in users] for field in fields}
+
+    # Streamed records: collect the fields in one pass without keeping the records
+    columns = {field: [] for field in fields}
+    for user in users:
+        for field in fields:
+            columns[field].append(user.get(field, defaults.get(field)))
+    return columns
@@ -0,0 +1,269 @@
+"""
+In-memory birthday lookup backed by a precomputed day index.
+
+Users are binned by the day of year of their createdOn and kept sorted by
+last_price (highest first) within each day, so "whose birthday is today",
+top-K per day, date ranges and per-month counts are answered from memory.
+
+The index is saved to birthday_index.json together with the byte offset of
+the progress journal it has read up to. Later runs only read journal records
+appended since then.
+
+Usage:
+    python birthdayIndex.py today --top 10
+    python birthdayIndex.py day "March 14"
+    python birthdayIndex.py range 2025-03-01 2025-03-07
+    python birthdayIndex.py months
+"""
+import argparse
+import os
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+from birthdayDays import DAY_INDEX, DAY_LABELS, FEB_29, MARCH_01, record_bins
+import fastJson
+from progressJournal import iter_journal, read_journal_header, write_json_atomic
+from userRecord import UserRecord
+from userStream import iter_users
+
+INDEX_FILE = "birthday_index.json"
+JOURNAL_FILE = "user_data_with_createdOn.jsonl"
+SNAPSHOT_FILE = "user_data_with_createdOn.json"
+MONTHS = [date(2000, month, 1).strftime("%B") for month in range(1, 13)]
+
+
+def _price_key(user):
+    """Sort key putting the highest last_price first and missing prices last"""
+    try:
+        return -float(user.last_price)
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def parse_day(text):
+    """Day bin for "March 14", "03-14" or "2025-03-14" (February 29 counts as March 1)"""
+    if text in DAY_INDEX:
+        index = DAY_INDEX[text]
+    else:
+        match = re.fullmatch(r"(?:\d{4}-)?(\d{1,2})-(\d{1,2})", text)
+        try:
+            # Any leap year, so February 29 is accepted
+            index = DAY_INDEX[date(2000, int(match.group(1)), int(match.group(2))).strftime("%B %d")]
+        except (AttributeError, ValueError):
+            raise ValueError(f"Unrecognised day: {text}") from None
+    return MARCH_01 if index == FEB_29 else index
+
+
+class BirthdayIndex:
+    """Users per day-of-year bin, each bin sorted by last_price descending
+
+    Users are held as slotted UserRecord objects (see userRecord), which
+    keep the index small enough for several hundred thousand users.
+    """
+
+    def __init__(self):
+        self.days = [[] for _ in DAY_LABELS]
+        self._keys = [[] for _ in DAY_LABELS]
+        self._bins = {}  # handle -> bin, to move or drop a user when a newer record arrives
+        self.journal_offset = 0
+        self.journal_header = None
+
+    def __len__(self):
+        return len(self._bins)
+
+    def build(self, users):
+        """Bulk-load users, binning every createdOn in one vectorized pass"""
+        latest = {}
+        for user in users:
+            record = user if isinstance(user, UserRecord) else UserRecord.from_dict(user)
+            if record.twitter_handle:
+                latest[record.twitter_handle] = record
+        records = list(latest.values())
+        bins = record_bins(records)
+        for user, day in zip(records, bins.tolist()):
+            self._remove(user.twitter_handle)
+            if day >= 0:
+                self.days[day].append(user)
+                self._bins[user.twitter_handle] = day
+        for day, users_on_day in enumerate(self.days):
+            users_on_day.sort(key=_price_key)
+            self._keys[day] = [_price_key(user) for user in users_on_day]
+
+    def add(self, user):
+        """Insert or replace one user, keeping its day sorted"""
+        self.add_many([user])
+
+    def add_many(self, users):
+        """Insert or replace users in order, binning their createdOn in one pass"""
+        records = [user if isinstance(user, UserRecord) else UserRecord.from_dict(user) for user in users]
+        records = [record for record in records if record.twitter_handle]
+        for user, day in zip(records, record_bins(records).tolist()):
+            handle = user.twitter_handle
+            self._remove(handle)
+            if day < 0:
+                continue
+            key = _price_key(user)
+            position = bisect_right(self._keys[day], key)
+            self._keys[day].insert(position, key)
+            self.days[day].insert(position, user)
+            self._bins[handle] = day
+
+    def _remove(self, handle):
+        day = self._bins.pop(handle, None)
+        if day is None:
+            return
+        for position, user in enumerate(self.days[day]):
+            if user.twitter_handle == handle:
+                del self.days[day][position]
+                del self._keys[day][position]
+                return
+
+    def update_from_journal(self, journal_file=JOURNAL_FILE):
+        """
+        Apply journal records appended since the last update.
+
+        Returns:
+            int: Number of records read, or None if the journal was replaced
+            and the index has to be rebuilt from scratch
+        """
+        if not os.path.exists(journal_file):
+            return 0
+        header = read_journal_header(journal_file)
+        if self.journal_header is not None and (header != self.journal_header
+                                                or os.path.getsize(journal_file) < self.journal_offset):
+            return None
+        self.journal_header = header
+
+        users = []
+        for kind, user, end in iter_journal(journal_file, self.journal_offset):
+            if kind == "user":
+                users.append(user)
+            self.journal_offset = end
+        if self._bins:
+            self.add_many(users)
+        else:
+            self.build(users)
+        return len(users)
+
+    def day(self, day, top=None):
+        """UserRecords whose birthday falls on a day (bin, label or date string), highest priced first"""
+        users = self.days[day if isinstance(day, int) else parse_day(day)]
+        return users[:top] if top else list(users)
+
+    def today(self, top=None, now=None):
+        now = now or datetime.now()
+        return self.day(parse_day(now.strftime("%Y-%m-%d")), top)
+
+    def range(self, start, end, top=None):
+        """{label: users} for every non-empty day from start to end inclusive, wrapping past December 31"""
+        first = start if isinstance(start, int) else parse_day(start)
+        last = end if isinstance(end, int) else parse_day(end)
+        span = (last - first) % len(DAY_LABELS) + 1
+        result = {}
+        for offset in range(span):
+            day = (first + offset) % len(DAY_LABELS)
+            if self.days[day]:
+                result[DAY_LABELS[day]] = self.day(day, top)
+        return result
+
+    def month_counts(self):
+        """Number of birthdays per month"""
+        counts = dict.fromkeys(MONTHS, 0)
+        for day, users in enumerate(self.days):
+            counts[DAY_LABELS[day].split()[0]] += len(users)
+        return counts
+
+    def save(self, filename=INDEX_FILE):
+        write_json_atomic({
+            "journal_offset": self.journal_offset,
+            "journal_header": self.journal_header,
+            "days": [[user.to_dict() for user in users] for users in self.days],
+        }, filename)
+
+    @classmethod
+    def load(cls, filename=INDEX_FILE):
+        """Load a saved index; days are stored already sorted"""
+        with open(filename, 'rb') as f:
+            data = fastJson.load(f)
+        index = cls()
+        index.journal_offset = data["journal_offset"]
+        index.journal_header = data["journal_header"]
+        index.days = [[UserRecord.from_dict(user) for user in users] for users in data["days"]]
+        index._keys = [[_price_key(user) for user in users] for users in index.days]
+        index._bins = {user.twitter_handle: day for day, users in enumerate(index.days) for user in users}
+        return index
+
+
+def open_index(index_file=INDEX_FILE, journal_file=JOURNAL_FILE, snapshot_file=SNAPSHOT_FILE):
+    """
+    Load the saved index and bring it up to date, rebuilding only when needed.
+
+    With a progress journal only records appended since the last run are
+    read; without one the index is built from the enriched snapshot.
+    """
+    index = None
+    if os.path.exists(index_file):
+        index = BirthdayIndex.load(index_file)
+        updated = index.update_from_journal(journal_file)
+        if updated is None:
+            print("Journal was replaced, rebuilding the birthday index...")
+            index = None
+        elif updated:
+            index.save(index_file)
+
+    if index is None:
+        index = BirthdayIndex()
+        if os.path.exists(journal_file):
+            index.update_from_journal(journal_file)
+        else:
+            index.build(iter_users(snapshot_file))
+        index.save(index_file)
+    return index
+
+
+def print_users(users):
+    for user in users:
+        print(f"  {user.twitter_handle} ({user.twitter_username}) - "
+              f"last price {user.last_price}, joined {user.created_on}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up Arena account birthdays")
+    parser.add_argument("--index", default=INDEX_FILE, help="Saved index file")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="Progress journal read incrementally")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE, help="Enriched snapshot used when there is no journal")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    today = commands.add_parser("today", help="Birthdays today")
+    today.add_argument("--top", type=int, help="Only the K highest priced users")
+    day = commands.add_parser("day", help='Birthdays on one day ("March 14", "03-14" or "2025-03-14")')
+    day.add_argument("day")
+    day.add_argument("--top", type=int, help="Only the K highest priced users")
+    date_range = commands.add_parser("range", help="Birthdays between two days, inclusive")
+    date_range.add_argument("start")
+    date_range.add_argument("end")
+    date_range.add_argument("--top", type=int, help="Only the K highest priced users per day")
+    commands.add_parser("months", help="Number of birthdays per month")
+    args = parser.parse_args()
+
+    index = open_index(args.index, args.journal, args.snapshot)
+
+    if args.command == "today":
+        users = index.today(args.top)
+        print(f"{len(users)} birthdays today")
+        print_users(users)
+    elif args.command == "day":
+        users = index.day(args.day, args.top)
+        print(f"{len(users)} birthdays on {DAY_LABELS[parse_day(args.day)]}")
+        print_users(users)
+    elif args.command == "range":
+        for label, users in index.range(args.start, args.end, args.top).items():
+            print(f"{label}:")
+            print_users(users)
+    elif args.command == "months":
+        for month, count in index.month_counts().items():
+            print(f"{month}: {count}")
+
+
+if __name__ == "__main__":
+    main()
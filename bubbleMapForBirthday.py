@@ -1,73 +1,90 @@
-import json
-import matplotlib.pyplot as plt
-import mplcursors
-from datetime import datetime
+import argparse
+import hashlib
+import html
+import io
+import os
+import re
 from collections import defaultdict
+import fastJson
+
+# Fields read from the snapshot; a columnar snapshot only maps these columns
+USER_FIELDS = ["twitter_handle", "createdOn"]
+
+# Bump when the chart layout changes so cached renders are redrawn
+RENDER_VERSION = 1
+RENDER_FORMATS = ("png", "svg", "html")
 
 # Load JSON data from file
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    with open(file_path, 'rb') as file:
+        return fastJson.load(file)
 
-# Process data to get birthdays and user details by day of the year
+# Process data to count birthdays by day of the year.
+# Accepts a loaded {"users": [...]} document, any iterable of user records,
+# or columns from columnarStore.load_columns.
 def get_birthdays_by_day(data):
-    birthdays = defaultdict(int)  # Use int to count occurrences
-    seen_users = set()  # Track unique users by their twitter_handle
-
-    for user in data.get("users", []):
-        twitter_handle = user.get("twitter_handle")
-        
-        # Skip if twitter_handle is missing or already seen
-        if not twitter_handle or twitter_handle in seen_users:
-            continue
-        
-        created_on = user.get("createdOn")
-        if not created_on:  # Skip if createdOn is null or missing
-            continue
-        
-        # Remove 'Z' from the timestamp to avoid issues with datetime.fromisoformat
-        created_on = created_on.replace("Z", "+00:00")
-        
-        try:
-            date_obj = datetime.fromisoformat(created_on)
-            day_of_year = date_obj.strftime("%B %d")
+    # NumPy is imported here so a cached headless render starts without it
+    import numpy as np
+    from birthdayDays import DAY_LABELS, as_strings, day_bins, first_occurrence, user_columns
+
+    columns = user_columns(data, USER_FIELDS)
+    handles = columns["twitter_handle"]
+
+    # Parse every timestamp at once; invalid or missing dates get bin -1
+    bins = day_bins(columns["createdOn"])
 
-            # If February 29th is found, move the user to March 1st
-            if day_of_year == "February 29":
-                day_of_year = "March 01"  # Move to March 1st
+    # Count each twitter_handle once, skipping rows without a handle
+    has_handle = as_strings(handles) != ""
+    keep = first_occurrence(handles, has_handle & (bins >= 0))
+    counts = np.bincount(bins[keep], minlength=len(DAY_LABELS))
 
-            # Increment the count for that day
-            birthdays[day_of_year] += 1
-            seen_users.add(twitter_handle)
-            
-        except ValueError:
-            # Skip users with invalid dates without logging
-            continue
+    birthdays = defaultdict(int)  # Use int to count occurrences
+    for index in np.flatnonzero(counts).tolist():
+        birthdays[DAY_LABELS[index]] = int(counts[index])
 
     return birthdays
 
+# Count birthdays from a JSON snapshot or a columnar snapshot directory
+def load_birthdays(snapshot):
+    if os.path.isdir(snapshot):
+        from columnarStore import load_columns
+        return get_birthdays_by_day(load_columns(snapshot, USER_FIELDS))
+    from userStream import iter_users
+    return get_birthdays_by_day(iter_users(snapshot))
+
+# Days with at least one birthday, in calendar order, and their counts.
+# Walks the 366 day labels once instead of sorting.
+def ordered_counts(birthdays):
+    from birthdayDays import DAY_LABELS
+    sorted_days = [day for day in DAY_LABELS if birthdays.get(day)]
+    return sorted_days, [birthdays[day] for day in sorted_days]
+
+def _draw(ax, sorted_days, sorted_counts):
+    bars = ax.bar(sorted_days, sorted_counts, color='skyblue')
+
+    # Customize plot
+    ax.set_title("User Birthdays by Date")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Number of Birthdays")
+
+    # Format x-axis to display only month names, once at each month's first bar
+    months = [day.split(" ")[0] for day in sorted_days]
+    ticks = [i for i, month in enumerate(months) if i == 0 or month != months[i - 1]]
+    ax.set_xticks(ticks)
+    ax.set_xticklabels([months[i] for i in ticks], rotation=45)
+    return bars
+
 # Generate a bar chart to visualize the data
 def plot_bar_chart(birthdays):
-    # Prepare data for plotting
-    days = list(birthdays.keys())
-    counts = [birthdays[day] for day in days]
+    # matplotlib and mplcursors are only needed for the interactive window
+    import matplotlib.pyplot as plt
+    import mplcursors
 
-    # Sort by date
-    sorted_days = sorted(days, key=lambda d: datetime.strptime(d, "%B %d"))
-    sorted_counts = [counts[days.index(day)] for day in sorted_days]
+    sorted_days, sorted_counts = ordered_counts(birthdays)
 
     # Create a bar chart
     plt.figure(figsize=(12, 6))
-    bars = plt.bar(sorted_days, sorted_counts, color='skyblue')
-
-    # Customize plot
-    plt.title("User Birthdays by Date")
-    plt.xlabel("Month")
-    plt.ylabel("Number of Birthdays")
-
-    # Format x-axis to display only month names
-    months = [datetime.strptime(day, "%B %d").strftime("%B") for day in sorted_days]
-    plt.xticks(range(len(sorted_days)), months, rotation=45)
+    bars = _draw(plt.gca(), sorted_days, sorted_counts)
 
     # Annotate bars with exact date and count (on hover)
     mplcursors.cursor(bars, hover=True).connect(
@@ -77,13 +94,107 @@ def plot_bar_chart(birthdays):
     plt.tight_layout()
     plt.show()
 
-# Main function
-def main():
+# Output format named by a chart file's extension, e.g. "png" for birthdays.png.
+# Raises ValueError for formats render_bar_chart can't write.
+def render_format(output_file):
+    fmt = os.path.splitext(output_file)[1].lstrip(".").lower()
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt} (use one of {', '.join(RENDER_FORMATS)})")
+    return fmt
+
+# Render the bar chart without a display to PNG, SVG or HTML (chosen by file extension).
+# HTML embeds the SVG with a hover tooltip per bar, like the interactive chart.
+def render_bar_chart(birthdays, output_file):
+    # The Agg canvas draws off-screen; no pyplot, GUI backend or mplcursors involved
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fmt = render_format(output_file)
+
+    sorted_days, sorted_counts = ordered_counts(birthdays)
+    figure = Figure(figsize=(12, 6))
+    FigureCanvasAgg(figure)
+    bars = _draw(figure.add_subplot(), sorted_days, sorted_counts)
+    figure.tight_layout()
+
+    if fmt != "html":
+        figure.savefig(output_file, format=fmt)
+        return
+
+    for index, bar in enumerate(bars):
+        bar.set_gid(f"day-{index}")
+    svg = io.StringIO()
+    figure.savefig(svg, format="svg")
+
+    def add_tooltip(match):
+        index = int(match.group(1))
+        title = html.escape(f"{sorted_days[index]}\n{sorted_counts[index]}")
+        return f"{match.group(0)}<title>{title}</title>"
+
+    svg_markup = re.sub(r'<g id="day-(\d+)">', add_tooltip, svg.getvalue())
+    svg_markup = svg_markup[svg_markup.index("<svg"):]  # Drop the XML prolog and doctype
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>User Birthdays by Date</title></head>\n"
+                f"<body>\n{svg_markup}\n</body>\n</html>\n")
+
+# Hash of the snapshot a chart is drawn from: the JSON file, or every file of a columnar snapshot
+def snapshot_hash(path):
+    digest = hashlib.sha256(f"v{RENDER_VERSION}".encode())
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+    for filename in files:
+        digest.update(os.path.basename(filename).encode())
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+# Render the chart from a snapshot unless output_file was already rendered from the same data.
+# The input hash is kept next to the output in <output_file>.hash.
+# Returns True if the chart was redrawn.
+def render_cached(snapshot, output_file, force=False):
+    render_format(output_file)  # Fail before hashing and aggregating the snapshot
+    key = snapshot_hash(snapshot)
+    hash_file = f"{output_file}.hash"
+    if not force and os.path.exists(output_file):
+        try:
+            with open(hash_file, 'r', encoding='utf-8') as f:
+                if f.read().strip() == key:
+                    return False
+        except FileNotFoundError:
+            pass
+
+    render_bar_chart(load_birthdays(snapshot), output_file)
+    with open(hash_file, 'w', encoding='utf-8') as f:
+        f.write(key + "\n")
+    return True
+
+# Show the chart, or render it to output (skipped if it is up to date unless force is set)
+def chart(output=None, force=False):
     input_file = "user_data_with_createdOn.json"  # Replace with your JSON file path
+    columnar_dir = "user_data_with_createdOn.columns"  # Columnar snapshot written by fetchBday, used when present
+    snapshot = columnar_dir if os.path.isdir(columnar_dir) else input_file
+
+    if output:
+        if render_cached(snapshot, output, force):
+            print(f"Chart written to {output}")
+        else:
+            print(f"{output} is up to date")
+        return
+
+    plot_bar_chart(load_birthdays(snapshot))
 
-    data = load_json(input_file)
-    birthdays = get_birthdays_by_day(data)
-    plot_bar_chart(birthdays)
+# Main function
+def main():
+    parser = argparse.ArgumentParser(description="Chart Arena account birthdays by day of year")
+    parser.add_argument("--output", help="Render headlessly to this .png, .svg or .html file instead of opening a window")
+    parser.add_argument("--force", action="store_true", help="Redraw even if the snapshot hasn't changed")
+    args = parser.parse_args()
+    if args.output:
+        try:
+            render_format(args.output)
+        except ValueError as e:
+            parser.error(str(e))
+    chart(args.output, args.force)
 
 if __name__ == "__main__":
     main()
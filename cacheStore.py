@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class SqliteCache:
+    """
+    Base for the on-disk caches (handleCache, httpCache): a SQLite database
+    shared between processes with an in-memory LRU in front of it.
+
+    Subclasses create their tables on self._db and hold self._lock around
+    every use of it and of the LRU.
+    """
+
+    def __init__(self, filename, lru_size):
+        """
+        Args:
+            filename: SQLite database path
+            lru_size: Number of entries kept in memory
+        """
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # Sharded enrichment opens the cache from several processes; wait for their writes
+        self._db = sqlite3.connect(filename, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+    def _remember(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ProcessWide:
+    """One shared instance per process, created by factory on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._instance is None:
+                self._instance = self._factory()
+            return self._instance
+
+    def reset(self):
+        """Close the shared instance, if any; the next get() creates a new one"""
+        with self._lock:
+            if self._instance is not None:
+                self._instance.close()
+                self._instance = None
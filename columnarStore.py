@@ -0,0 +1,275 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+META_FILE = "meta.json"
+
+# Column kinds and how they are laid out on disk:
+#   int, float, bool -> <name>.npy holding one typed value per row
+#   number           -> ints and floats mixed: <name>.npy (float64) + <name>.int.npy (int64)
+#                       + <name>.isint.npy marking the rows that were ints
+#   str, json        -> <name>.data.npy (UTF-8 bytes) + <name>.offsets.npy (n + 1 byte offsets)
+# Any kind may add <name>.null.npy / <name>.missing.npy masks for null or absent values.
+_MISSING = object()
+
+
+def _is_int64(value):
+    return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+
+
+def _infer_kind(values):
+    present = [value for value in values if value is not None and value is not _MISSING]
+    if all(isinstance(value, bool) for value in present):
+        return "bool"
+    if all(_is_int64(value) for value in present):
+        return "int"
+    if all(isinstance(value, float) for value in present):
+        return "float"
+    # Integers mixed with floats keep their type, so 4 doesn't come back as 4.0
+    if all(isinstance(value, float) or _is_int64(value) for value in present):
+        return "number"
+    if all(isinstance(value, str) for value in present):
+        return "str"
+    return "json"
+
+
+def _encode_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _write_column(directory, name, kind, values):
+    null = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    missing = np.fromiter((value is _MISSING for value in values), dtype=bool, count=len(values))
+    empty = null | missing
+
+    if kind in ("int", "float", "bool"):
+        dtype = {"int": np.int64, "float": np.float64, "bool": bool}[kind]
+        column = np.zeros(len(values), dtype=dtype)
+        if len(values):
+            column[~empty] = [value for value in values if value is not None and value is not _MISSING]
+        np.save(os.path.join(directory, f"{name}.npy"), column)
+    elif kind == "number":
+        is_int = np.fromiter((_is_int64(value) for value in values), dtype=bool, count=len(values))
+        floats = np.zeros(len(values), dtype=np.float64)
+        ints = np.zeros(len(values), dtype=np.int64)
+        for index, value in enumerate(values):
+            if value is not None and value is not _MISSING:
+                floats[index] = value
+                if is_int[index]:
+                    ints[index] = value
+        np.save(os.path.join(directory, f"{name}.npy"), floats)
+        np.save(os.path.join(directory, f"{name}.int.npy"), ints)
+        np.save(os.path.join(directory, f"{name}.isint.npy"), is_int)
+    else:
+        encode = (lambda value: value) if kind == "str" else (lambda value: json.dumps(value, ensure_ascii=False))
+        data, offsets = _encode_strings(
+            "" if value is None or value is _MISSING else encode(value) for value in values
+        )
+        np.save(os.path.join(directory, f"{name}.data.npy"), data)
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+    if null.any():
+        np.save(os.path.join(directory, f"{name}.null.npy"), null)
+    if missing.any():
+        np.save(os.path.join(directory, f"{name}.missing.npy"), missing)
+
+
+def save_columns(users, output_dir, header=None):
+    """
+    Write user records as a directory of typed NumPy column files.
+
+    Each field becomes its own column so loaders can memory-map only what
+    they need. The directory is swapped in atomically once complete.
+
+    Args:
+        users: Iterable of user dictionaries
+        output_dir: Destination directory (replaced if it exists)
+        header: Extra top-level fields to keep, such as total_users and timestamp
+
+    Returns:
+        int: Number of rows written
+    """
+    columns = {}
+    rows = 0
+    for user in users:
+        for name in user:
+            if name not in columns:
+                columns[name] = [_MISSING] * rows
+        for name, values in columns.items():
+            values.append(user.get(name, _MISSING))
+        rows += 1
+
+    tmp_dir = f"{output_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    kinds = {}
+    for index, (name, values) in enumerate(columns.items()):
+        kinds[name] = _infer_kind(values)
+        _write_column(tmp_dir, f"c{index}", kinds[name], values)
+
+    meta = {
+        "header": header or {},
+        "rows": rows,
+        "columns": [{"name": name, "kind": kind, "file": f"c{index}"} for index, (name, kind) in enumerate(kinds.items())],
+    }
+    with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+    old_dir = f"{output_dir}.old"
+    if os.path.isdir(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return rows
+
+
+class Column:
+    """A memory-mapped column; indexing returns plain Python values (None for null)"""
+
+    def __init__(self, directory, spec, rows):
+        self.name = spec["name"]
+        self.kind = spec["kind"]
+        self.rows = rows
+        base = os.path.join(directory, spec["file"])
+        if self.kind in ("int", "float", "bool", "number"):
+            self.values = np.load(f"{base}.npy", mmap_mode='r')
+            if self.kind == "number":
+                self.ints = np.load(f"{base}.int.npy", mmap_mode='r')
+                self.is_int = np.load(f"{base}.isint.npy", mmap_mode='r')
+        else:
+            self.data = np.load(f"{base}.data.npy", mmap_mode='r')
+            self.offsets = np.load(f"{base}.offsets.npy", mmap_mode='r')
+        self.null = self._load_mask(f"{base}.null.npy")
+        self.missing = self._load_mask(f"{base}.missing.npy")
+
+    @staticmethod
+    def _load_mask(path):
+        return np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+    def __len__(self):
+        return self.rows
+
+    def is_empty(self, index):
+        """True if the value is null or absent from the record"""
+        return bool((self.null is not None and self.null[index]) or (self.missing is not None and self.missing[index]))
+
+    def __getitem__(self, index):
+        if self.is_empty(index):
+            return None
+        if self.kind == "number" and self.is_int[index]:
+            return self.ints[index].item()
+        if self.kind in ("int", "float", "bool", "number"):
+            return self.values[index].item()
+        text = bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+        return text if self.kind == "str" else json.loads(text)
+
+    def to_list(self):
+        """Decode the whole column at once, which is much faster than indexing row by row"""
+        if self.kind in ("int", "float", "bool", "number"):
+            values = self.values.tolist()
+            if self.kind == "number":
+                ints = self.ints.tolist()
+                for index in np.flatnonzero(self.is_int).tolist():
+                    values[index] = ints[index]
+        else:
+            blob = bytes(self.data)
+            offsets = self.offsets.tolist()
+            values = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.rows)]
+            if self.kind == "json":
+                # Null and absent rows are stored as "", which no JSON value encodes to
+                values = [json.loads(value) if value else None for value in values]
+        for mask in (self.null, self.missing):
+            if mask is not None:
+                for index in np.flatnonzero(mask).tolist():
+                    values[index] = None
+        return values
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_columns(directory, columns=None):
+    """
+    Memory-map columns from a snapshot directory.
+
+    Args:
+        directory: Snapshot directory written by save_columns
+        columns: Names of the columns to open (default: all); names that are
+            not in the snapshot are skipped
+
+    Returns:
+        Dict[str, Column]: Opened columns keyed by field name
+    """
+    meta = read_meta(directory)
+    wanted = None if columns is None else set(columns)
+    return {
+        spec["name"]: Column(directory, spec, meta["rows"])
+        for spec in meta["columns"]
+        if wanted is None or spec["name"] in wanted
+    }
+
+
+def iter_column_users(directory, columns=None):
+    """Yield user dictionaries rebuilt from the requested columns"""
+    opened = load_columns(directory, columns)
+    names = list(opened)
+    decoded = [opened[name].to_list() for name in names]
+    missing = [opened[name].missing for name in names]
+    rows = read_meta(directory)["rows"]
+    for index in range(rows):
+        yield {
+            name: values[index]
+            for name, values, absent in zip(names, decoded, missing)
+            if absent is None or not absent[index]
+        }
+
+
+def check_round_trip(users, directory=None):
+    """
+    Save users as columns and read them back, returning the rows that changed.
+
+    Rows are compared by their JSON encoding, so 4 coming back as 4.0
+    counts as a change even though the two compare equal in Python.
+
+    Args:
+        users: List of user dictionaries
+        directory: Scratch snapshot directory (default: a temporary one)
+
+    Returns:
+        List[int]: Indexes of the rows that did not survive the round trip
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = directory or os.path.join(scratch, "users.columns")
+        save_columns(users, directory)
+        encode = lambda user: json.dumps(user, sort_keys=True, ensure_ascii=False)
+        changed = [index for index, (user, loaded) in enumerate(zip(users, iter_column_users(directory)))
+                   if encode(user) != encode(loaded)]
+        rows = read_meta(directory)["rows"]
+    if rows != len(users):
+        changed.extend(range(min(rows, len(users)), max(rows, len(users))))
+    return changed
+
+
+if __name__ == "__main__":
+    import argparse
+    from userStream import iter_users
+
+    parser = argparse.ArgumentParser(description="Check that a JSON snapshot survives the columnar format unchanged")
+    parser.add_argument("snapshot", nargs="?", default="user_data_with_createdOn.json", help="JSON snapshot to check")
+    args = parser.parse_args()
+    users = list(iter_users(args.snapshot))
+    changed = check_round_trip(users)
+    for index in changed[:10]:
+        print(f"Row {index} changed: {users[index].get('twitter_handle')}")
+    print(f"{len(users) - len(changed)} of {len(users)} users round-trip unchanged")
+    raise SystemExit(1 if changed else 0)
@@ -0,0 +1,89 @@
+"""
+JSON codec for the hot paths: API responses, journal lines and snapshots.
+
+Uses orjson when it is installed (pip install orjson) and the standard
+library otherwise; both produce the same documents, so files written by one
+are read by the other. Decode errors are json.JSONDecodeError either way
+(orjson's error subclasses it), so existing except clauses keep working.
+
+Output matches json.dumps(..., ensure_ascii=False) and, for dumps_pretty,
+indent=2, except that orjson spells some floats differently (1e-5 rather
+than 1e-05). Values orjson can't encode (integers beyond 64 bits, non-string
+keys) fall back to the standard library. Objects with a to_dict() method,
+such as userRecord.UserRecord, are encoded as that dictionary.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(value):
+    """Encode objects that aren't JSON types, such as UserRecords, through their to_dict()"""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def loads(data):
+    """Decode a str or UTF-8 bytes document"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(f):
+    """Decode a whole file object (text or binary)"""
+    return loads(f.read())
+
+
+def dumps(value):
+    """Compact single-line encoding, e.g. for JSONL records"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, default=_default)
+
+
+def dumps_pretty(value):
+    """Two-space indented encoding, as written by json.dump(..., indent=2, ensure_ascii=False)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(value, indent=2, ensure_ascii=False, default=_default)
+
+
+def dump(value, f):
+    """Write the indented encoding to a text file object"""
+    f.write(dumps_pretty(value))
+
+
+def response_json(response):
+    """Decode an API response body"""
+    return loads(response.content)
+
+
+def handle_created_on(data):
+    """
+    Extract createdOn from a user/handle response.
+
+    Returns:
+        Optional[str]: createdOn, or None if the response has no user or no date
+
+    Raises:
+        json.JSONDecodeError: If the body isn't JSON or createdOn isn't a string
+    """
+    body = loads(data) if isinstance(data, (bytes, str)) else data
+    user = body.get("user") if isinstance(body, dict) else None
+    created_on = user.get("createdOn") if isinstance(user, dict) else None
+    if created_on is not None and not isinstance(created_on, str):
+        raise JSONDecodeError("createdOn is not a string", repr(created_on), 0)
+    return created_on
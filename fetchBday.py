@@ -1,133 +1,545 @@
 import json
 import requests
-import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+import glob
+import heapq
 import sys
+import tempfile
+import threading
+import time
 from dotenv import load_dotenv
 import os
+import fastJson
+import metrics
+from arenaClient import STARSARENA_API, ArenaClient, auth_headers, get_client
+from rateLimiter import TokenBucket, is_retryable, is_throttled, parse_retry_after
+from userStream import iter_users, read_header
+from snapshotDiff import current_snapshot
+from handleCache import get_cache
+from progressJournal import ProgressJournal, compact_journal, iter_current_users, iter_journal
+from userRecord import UserRecord
 
 load_dotenv()
 
 
 
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
-def load_existing_data(filename="user_data.json"):
-    """Load the original user data"""
-    with open(filename, 'r', encoding='utf-8') as f:
-        return json.load(f)
+# Comma-separated tokens; with more than one, enrichment runs one shard per token
+AUTH_TOKENS = [token.strip() for token in os.getenv("AUTH_TOKENS", "").split(",") if token.strip()] or [AUTH_TOKEN]
+JOURNAL_FILE = "user_data_with_createdOn.jsonl"
+SHARD_JOURNAL_FILE = "user_data_with_createdOn.shard{index}.jsonl"
+COLUMNAR_DIR = "user_data_with_createdOn.columns"  # Set to None to only write JSON
 
-def load_progress_data(filename="user_data_with_createdOn.json"):
-    """Load existing progress if any"""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
+def lookup_creation_date(twitter_handle, client=None, limiter=None, max_retries=3, cache=None, use_negative=True,
+                         auth_token=None):
+    """Look up a user's creation date and say how the lookup ended
 
-def save_progress(data, filename="user_data_with_createdOn.json"):
-    """Save current progress"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    Requests go through the shared client with the HTTP cache unless another one is given.
+    When a rate limiter is given, 5xx responses are retried; 429/503 ones after the limiter backs off.
+    Results are kept in the shared handle cache (see handleCache), so only
+    unknown handles and expired negative results hit the network; pass
+    cache=False to bypass it, or use_negative=False to ignore cached misses.
+    auth_token overrides AUTH_TOKEN, e.g. for one shard of a sharded run.
 
-def fetch_creation_date(twitter_handle):
-    """Fetch creation date for a user from the API"""
+    Returns:
+        (created_on, status): status is "found", "empty" (the account has no
+        createdOn), "not_found" (404, unknown or deleted account) or "error"
+        (a transient network, throttling or parsing failure)
+    """
     if not twitter_handle:
-        return None
+        return None, "empty"
+
+    if cache is None:
+        cache = get_cache()
+    if cache:
+        hit, created_on = cached_creation_date(twitter_handle, cache, use_negative)
+        if hit:
+            return created_on, "found" if created_on else "empty"
+        metrics.inc("arena_handle_cache_total", result="miss")
 
-    url = f"https://api.starsarena.com/user/handle?handle={twitter_handle}"
+    url = f"{STARSARENA_API}/user/handle?handle={twitter_handle}"
+    client = client or get_client(cached=True)
     
     try:
-
-        headers = {
-            "Authorization": f"Bearer {AUTH_TOKEN}",
-            "Content-Type": "application/json",
-            "Referer": "https://arena.social/",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        response = requests.get(url, headers=headers)
+        headers = auth_headers(auth_token or AUTH_TOKEN)
+        for attempt in range(max_retries + 1):
+            if limiter:
+                limiter.acquire()
+            response = client.get(url, headers=headers)
+            if not (limiter and is_retryable(response) and attempt < max_retries):
+                break
+            if is_throttled(response):
+                limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+            else:
+                limiter.on_error()
+        if response.status_code == 404:
+            # Unknown or deleted account; cache it as a negative result
+            if cache:
+                cache.put(twitter_handle, None)
+            return None, "not_found"
         response.raise_for_status()
-        data = response.json()
+        if limiter:
+            limiter.on_success()
+        with metrics.timer("arena_json_decode_seconds", endpoint="user/handle"):
+            created_on = fastJson.handle_created_on(fastJson.response_json(response))
 
-        return data.get('user', {}).get('createdOn')
+        if cache:
+            cache.put(twitter_handle, created_on)
+        return created_on, "found" if created_on else "empty"
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data for {twitter_handle}: {str(e)}")
-        return None
+        return None, "error"
     except json.JSONDecodeError as e:
         print(f"Error parsing response for {twitter_handle}: {str(e)}")
-        return None
+        return None, "error"
     
     except Exception as e:
         print(f"An unexpected error occurred: {str(e)}")
-        return None
+        return None, "error"
 
-def process_users():
-    # Load original data
-    print("Loading original user data...")
-    original_data = load_existing_data()
-    
-    # Load existing progress if any
-    progress_data = load_progress_data()
-    
-    if progress_data:
-        print("Found existing progress, continuing from where we left off...")
-        working_data = progress_data
-    else:
-        print("Starting fresh...")
-        working_data = {
-            "total_users": original_data["total_users"],
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "users": []
-        }
-    
-    # Create set of handles we've already processed
-    processed_handles = {user.get('twitter_handle') for user in working_data['users']}
+def cached_creation_date(twitter_handle, cache=None, use_negative=True):
+    """Look a handle up in the handle cache only, without a request
+
+    Returns:
+        (hit, created_on): hit is False if the lookup has to ask the API
+    """
+    if cache is None:
+        cache = get_cache()
+    hit, created_on = cache.get(twitter_handle)
+    if hit and (created_on or use_negative):
+        metrics.inc("arena_handle_cache_total", result="hit")
+        return True, created_on
+    return False, None
+
+def fetch_creation_date(twitter_handle, client=None, limiter=None, max_retries=3, cache=None, auth_token=None):
+    """Fetch creation date for a user from the API (see lookup_creation_date)"""
+    created_on, _ = lookup_creation_date(twitter_handle, client, limiter, max_retries, cache, auth_token=auth_token)
+    return created_on
+
+def enrich_user(user, client=None, limiter=None, auth_token=None):
+    """Return a copy of a user (dict or UserRecord) with its createdOn field filled in
+
+    A UserRecord comes back as a UserRecord that shares everything but
+    createdOn with the original; a dictionary comes back as a dictionary.
+    """
+    twitter_handle = user.get('twitter_handle')
+    created_on = fetch_creation_date(twitter_handle, client, limiter, auth_token=auth_token) if twitter_handle else None
+    return with_created_on(user, created_on)
+
+def with_created_on(user, created_on):
+    """Copy of a user (dict or UserRecord, keeping the type) with createdOn set"""
+    if isinstance(user, UserRecord):
+        return user.with_created_on(created_on)
+    return {**user, 'createdOn': created_on}
+
+def _resolved(value):
+    """A future that already holds value"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+def field_score(field, user):
+    """A user's numeric field as a priority score; missing or non-numeric values rank last"""
+    try:
+        return float(user.get(field))
+    except (TypeError, ValueError):
+        return float("-inf")
+
+# Default enrichment priority: highest last_price first
+price_score = partial(field_score, "last_price")
+
+def schedule(pending, score=price_score):
+    """Yield (position, UserRecord) pairs highest score first, ties in snapshot order
+
+    Users are spilled to a temporary file as they are scored and read back
+    one at a time, so only (score, position, offset) triples stay in memory.
+
+    Args:
+        pending: Iterable of (1-based position, user) pairs
+        score: Callable giving a user's priority (higher is enriched sooner); must be
+            picklable, e.g. a partial of field_score, for sharded runs
+    """
+    with tempfile.TemporaryFile() as spill:
+        heap = []
+        for i, user in pending:
+            heap.append((-score(user), i, spill.tell()))
+            spill.write(fastJson.dumps(user).encode('utf-8') + b"\n")
+        heapq.heapify(heap)
+        while heap:
+            _, i, offset = heapq.heappop(heap)
+            spill.seek(offset)
+            yield i, UserRecord.from_dict(fastJson.loads(spill.readline()))
+
+class _RequestBudget:
+    """Requests sent through a limiter plus those still owed by lookups in flight
+
+    A lookup owes one request from the moment it is submitted until it takes
+    its first token (from then on limiter.requests counts it) or finishes
+    without one. Both happen under one lock, so no request is counted twice
+    or missed.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._owed = 0
+        self._lock = threading.Lock()
+
+    def spent(self):
+        with self._lock:
+            return self.limiter.requests + self._owed
+
+    def lookup_limiter(self):
+        """A limiter for one new lookup, owing one request until it takes a token"""
+        with self._lock:
+            self._owed += 1
+        return _LookupLimiter(self)
+
+class _LookupLimiter:
+    """One lookup's view of the shared limiter (see _RequestBudget)"""
+
+    def __init__(self, budget):
+        self._budget = budget
+        self._owing = True
+
+    def _settle(self):
+        # Called with the budget's lock held
+        if self._owing:
+            self._owing = False
+            self._budget._owed -= 1
+
+    def settle(self):
+        with self._budget._lock:
+            self._settle()
+
+    def acquire(self):
+        with self._budget._lock:
+            wait = self._budget.limiter.reserve()
+            self._settle()
+        metrics.observe("arena_ratelimit_wait_seconds", wait, limiter="token_bucket")
+        if wait > 0:
+            time.sleep(wait)
+
+    def __getattr__(self, name):
+        # on_success / on_throttle / on_error go straight to the shared limiter
+        return getattr(self._budget.limiter, name)
+
+def _budgeted_enrich(user, client, limiter, auth_token):
+    try:
+        return enrich_user(user, client, limiter, auth_token)
+    finally:
+        limiter.settle()
+
+def enrich_into_journal(pending, journal, total_users, workers=8, rate=4.0, auth_token=None,
+                        deadline=None, max_requests=None, known=None, on_record=None):
+    """Enrich (position, user) pairs with a bounded worker pool, appending results to a journal in order
+
+    Args:
+        pending: Iterable of (1-based position, user) pairs still to enrich
+        journal: Open ProgressJournal the enriched records are appended to
+        total_users: Snapshot size, for progress output
+        workers: Number of handles looked up concurrently
+        rate: Initial (and maximum) number of API requests per second across all workers
+        auth_token: Bearer token for the lookups (default: AUTH_TOKEN)
+        deadline: time.monotonic() value after which no new lookups are started
+        max_requests: Number of API requests after which no new lookups are started
+            (cache hits and known users are free; a lookup in flight counts as one
+            request until it sends its first, so only retries can go over)
+        known: handle -> createdOn already found (see journal_created_on); these
+            users get it without a lookup
+        on_record: Called with (position, record) after each record is journaled;
+            returning False stops the run
+
+    Returns:
+        bool: False if the deadline, request budget or on_record stopped the run early
+    """
+    limiter = TokenBucket(rate, capacity=workers)
+    budget = _RequestBudget(limiter)
+    in_flight = deque()
     
-    # Process each user
-    total_users = len(original_data['users'])
+    def budget_spent():
+        if deadline is not None and time.monotonic() >= deadline:
+            print("Time budget used up, finishing the lookups in flight...")
+            return True
+        if max_requests is not None and budget.spent() >= max_requests:
+            print(f"Request budget of {max_requests} used up, finishing the lookups in flight...")
+            return True
+        return False
     
-    for i, user in enumerate(original_data['users'], 1):
-        twitter_handle = user.get('twitter_handle')
+    def record_result(i, future):
+        user_data = future.result()
+        twitter_handle = user_data.get('twitter_handle')
+        created_on = user_data.get('createdOn')
         
-        # Skip if we've already processed this user
-        if twitter_handle in processed_handles:
-            continue
-            
         print(f"Processing {i}/{total_users}: {twitter_handle or 'No handle'}")
-        
-        # Copy original user data
-        user_data = user.copy()
-        
-        if twitter_handle:
-            # Add delay to avoid rate limiting
-            time.sleep(1)
-            
-            # Fetch creation date
-            created_on = fetch_creation_date(twitter_handle)
-            if created_on:
-                user_data['createdOn'] = created_on
-                print(f"Found creation date: {created_on}")
-            else:
-                user_data['createdOn'] = None
-                print("Could not fetch creation date")
-        else:
-            user_data['createdOn'] = None
+        if not twitter_handle:
             print("No Twitter handle available")
+        elif created_on:
+            print(f"Found creation date: {created_on}")
+        else:
+            print("Could not fetch creation date")
         
-        # Add to working data
-        working_data['users'].append(user_data)
-        
-        # Save progress every 10 users
-        if i % 10 == 0:
-            save_progress(working_data)
+        # Add to the journal, which fsyncs every few records
+        journal.append(user_data, i)
+        if journal.pending == 0:
             print(f"Progress saved: {i}/{total_users} users processed")
+        return on_record is None or on_record(i, user_data) is not False
+    
+    with ArenaClient(pool_size=workers, cache=True) as client, ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            # Keep a bounded window of lookups running ahead of the writer,
+            # collecting results in original order
+            completed = True
+            for i, user in pending:
+                if budget_spent():
+                    completed = False
+                    break
+                # Users whose createdOn is already known or cached are resolved here, so only
+                # lookups that will ask the API take a worker and count against the budget
+                handle = user.get('twitter_handle')
+                if not handle:
+                    in_flight.append((i, _resolved(with_created_on(user, None))))
+                elif known and handle in known:
+                    in_flight.append((i, _resolved(with_created_on(user, known[handle]))))
+                else:
+                    hit, created_on = cached_creation_date(handle)
+                    if hit:
+                        in_flight.append((i, _resolved(with_created_on(user, created_on))))
+                    else:
+                        in_flight.append((i, executor.submit(_budgeted_enrich, user, client,
+                                                             budget.lookup_limiter(), auth_token)))
+                if len(in_flight) >= workers * 2 and not record_result(*in_flight.popleft()):
+                    return False
+            while in_flight:
+                if not record_result(*in_flight.popleft()):
+                    return False
+            return completed
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+def prepare_journal():
+    """Open the progress journal, seeding it on the first run
+
+    Only the handles in the journal are read, not its records.
+
+    Returns:
+        (original_header, original_users, processed_handles): the latest
+        snapshot (user_data.json plus any logged changes; without a change log
+        users are streamed from disk) and the handles already in the journal
+    """
+    print("Loading original user data...")
+    original_header, original_users = current_snapshot("user_data.json")
+    seed_journal(original_header["total_users"])
+    
+    # Create set of handles we've already processed
+    processed_handles = journal_handles(JOURNAL_FILE)
+    return original_header, original_users, processed_handles
+
+def seed_journal(total_users):
+    """Give the progress journal its header on the first run, carrying over an older JSON checkpoint if there is one"""
+    with ProgressJournal(JOURNAL_FILE) as journal:
+        if not journal.is_empty():
+            print("Found existing progress, continuing from where we left off...")
+        elif os.path.exists("user_data_with_createdOn.json"):
+            # Seed a new journal, carrying over users from an older JSON checkpoint
+            print("Found existing progress, continuing from where we left off...")
+            journal.write_header(read_header("user_data_with_createdOn.json"))
+            for i, user in enumerate(iter_users("user_data_with_createdOn.json"), 1):
+                journal.append(user, i)
+        else:
+            print("Starting fresh...")
+            journal.write_header({
+                "total_users": total_users,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+
+def finish_output():
+    """Compact the journal into the final document (and its columnar copy)"""
+    compact_journal(JOURNAL_FILE, "user_data_with_createdOn.json")
+    if COLUMNAR_DIR:
+        from columnarStore import save_columns
+        save_columns(iter_users("user_data_with_createdOn.json"), COLUMNAR_DIR, read_header("user_data_with_createdOn.json"))
+
+def report_coverage(total_users, completed):
+    enriched = len(journal_handles(JOURNAL_FILE))
+    if completed:
+        print("All users processed!")
+    else:
+        print(f"Stopped early with {enriched} of {total_users} users enriched; "
+              "the next run continues with the highest priority users left")
+
+def process_users(workers=8, rate=4.0, score=price_score, time_budget=None, max_requests=None):
+    """Enrich users with createdOn using a bounded worker pool, highest priority first
+
+    Pending users are looked up in score order, so a run cut short by its
+    budget (or interrupted) has enriched the most valuable accounts, and the
+    enriched output is written either way.
+
+    Args:
+        workers: Number of handles looked up concurrently
+        rate: Initial (and maximum) number of API requests per second across all workers
+        score: Priority of a user, higher first (default: last_price)
+        time_budget: Seconds after which no new lookups are started
+        max_requests: Number of API requests after which no new lookups are started
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    original_header, original_users, processed_handles = prepare_journal()
+    total_users = original_header["total_users"]
+    
+    # Skip users we've already processed
+    pending = schedule((
+        (i, user) for i, user in enumerate(original_users, 1)
+        if user.get('twitter_handle') not in processed_handles
+    ), score)
+    
+    completed = False
+    try:
+        with ProgressJournal(JOURNAL_FILE) as journal:
+            completed = enrich_into_journal(pending, journal, total_users, workers, rate,
+                                            deadline=deadline, max_requests=max_requests)
+    finally:
+        # Write out whatever was enriched, so a partial run still leaves usable output
+        finish_output()
+    report_coverage(total_users, completed)
+
+def shard_journal_file(index):
+    return SHARD_JOURNAL_FILE.format(index=index)
+
+def journal_handles(journal_filename):
+    """Handles with a record in a journal (empty if it doesn't exist)"""
+    try:
+        return {user.get('twitter_handle') for kind, user, _ in iter_journal(journal_filename) if kind == "user"}
+    except FileNotFoundError:
+        return set()
+
+def journal_created_on(journal_filename):
+    """handle -> createdOn for every handle a journal has found a date for (empty if it doesn't exist)"""
+    known = {}
+    try:
+        for kind, user, _ in iter_journal(journal_filename):
+            if kind == "user" and user.get('twitter_handle') and user.get('createdOn'):
+                known[user['twitter_handle']] = user['createdOn']
+    except FileNotFoundError:
+        pass
+    return known
+
+def enrich_shard(index, shard_count, auth_token, workers=8, rate=4.0, score=price_score, time_budget=None,
+                 max_requests=None):
+    """Enrich one shard of the snapshot into its own journal; runs in a worker process
+
+    The shard holds every shard_count-th pending user in score order (see
+    process_users), starting at rank index, so every shard gets a similar mix
+    of high and low priority accounts and together they work down the same
+    priority list. Handles already in this shard's journal are skipped, so
+    an interrupted shard resumes where it stopped.
+
+    Returns:
+        bool: False if the shard's time or request budget stopped it early
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    original_header, original_users = current_snapshot("user_data.json")
+    journal_filename = shard_journal_file(index)
+    processed_handles = journal_handles(JOURNAL_FILE)
+    shard_handles = journal_handles(journal_filename)
+    
+    # Ranks are taken before this shard's own progress is removed, so all shards agree on them
+    ranked = schedule((
+        (i, user) for i, user in enumerate(original_users, 1)
+        if user.get('twitter_handle') and user['twitter_handle'] not in processed_handles
+    ), score)
+    pending = (
+        (i, user) for rank, (i, user) in enumerate(ranked)
+        if rank % shard_count == index and user['twitter_handle'] not in shard_handles
+    )
+    
+    with ProgressJournal(journal_filename) as journal:
+        if journal.is_empty():
+            journal.write_header({"shard": index, "shards": shard_count})
+        return enrich_into_journal(pending, journal, original_header["total_users"], workers, rate, auth_token,
+                                   deadline, max_requests)
+
+def merge_shard_journals():
+    """Append the records of every shard journal to the main journal, then remove them
+
+    Records keep the snapshot position they were enriched at, so the
+    compacted output is in snapshot order whatever order they are merged in.
+
+    Returns:
+        int: Number of records merged
+    """
+    shard_files = sorted(glob.glob(SHARD_JOURNAL_FILE.format(index="*")))
+    if not shard_files:
+        return 0
     
-    # Final save
-    save_progress(working_data)
-    print("All users processed!")
+    # Shards skip users without a handle; record those once, like process_users does
+    processed_handles = journal_handles(JOURNAL_FILE)
+    handleless_done = any(not handle for handle in processed_handles)
+    
+    merged = 0
+    with ProgressJournal(JOURNAL_FILE) as journal:
+        for shard_file in shard_files:
+            for i, user in iter_current_users(shard_file, with_index=True):
+                journal.append(user, i)
+                merged += 1
+        if not handleless_done:
+            _, original_users = current_snapshot("user_data.json")
+            for i, user in enumerate(original_users, 1):
+                if not user.get('twitter_handle'):
+                    journal.append({**user, 'createdOn': None}, i)
+    
+    for shard_file in shard_files:
+        os.remove(shard_file)
+    return merged
+
+def process_users_sharded(auth_tokens, workers=8, rate=4.0, score=price_score, time_budget=None, max_requests=None):
+    """Enrich every user with one worker process per auth token
 
-def main():
+    Each process has its own token, client and rate limiter, so throughput
+    scales with the number of tokens. Shards write to their own journals,
+    which are merged into the main journal in snapshot order at the end.
+
+    Args:
+        auth_tokens: One bearer token per shard
+        workers: Number of handles looked up concurrently in each shard
+        rate: Initial (and maximum) number of API requests per second per shard
+        score: Priority of a user, higher first (default: last_price)
+        time_budget: Seconds after which no new lookups are started
+        max_requests: Request budget, split evenly across the shards
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    original_header, _, _ = prepare_journal()
+    # Shards left over from an interrupted run
+    if merge_shard_journals():
+        print("Merged shard journals from a previous run")
+    
+    print(f"Enriching with {len(auth_tokens)} shards...")
+    shard_budget = -(-max_requests // len(auth_tokens)) if max_requests is not None else None
+    completed = False
     try:
-        process_users()
+        with ProcessPoolExecutor(max_workers=len(auth_tokens)) as executor:
+            futures = [
+                executor.submit(enrich_shard, index, len(auth_tokens), auth_token, workers, rate, score,
+                                max(0.0, deadline - time.monotonic()) if deadline is not None else None,
+                                shard_budget)
+                for index, auth_token in enumerate(auth_tokens)
+            ]
+            completed = all([future.result() for future in futures])
+    finally:
+        # Merge and write out whatever the shards enriched, so a partial run still leaves usable output
+        print(f"Merged {merge_shard_journals()} records from {len(auth_tokens)} shards")
+        finish_output()
+    report_coverage(original_header["total_users"], completed)
+
+def main(workers=8, rate=4.0, priority="last_price", time_budget=None, max_requests=None):
+    score = partial(field_score, priority)
+    try:
+        if len(AUTH_TOKENS) > 1:
+            process_users_sharded(AUTH_TOKENS, workers, rate, score, time_budget, max_requests)
+        else:
+            process_users(workers, rate, score, time_budget, max_requests)
     except KeyboardInterrupt:
         print("\nScript interrupted by user. Progress has been saved.")
         sys.exit(0)
@@ -138,4 +550,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    metrics.run_instrumented(main)
\ No newline at end of file
@@ -1,96 +1,68 @@
-import json
-import csv
-from datetime import datetime
+import fastJson
+import os
 from collections import defaultdict
+import numpy as np
+import metrics
+from birthdayCsv import write_birthdays_csv
+from birthdayDays import DAY_LABELS, day_bins, first_occurrence, user_columns
+from columnarStore import load_columns
+from userStream import iter_users
+
+# Fields read from the snapshot; a columnar snapshot only maps these columns
+USER_FIELDS = ["twitter_handle", "twitter_username", "last_price", "createdOn"]
 
 # Load JSON data from file
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    with open(file_path, 'rb') as file:
+        return fastJson.load(file)
 
-# Process data to get birthdays and user details by day of the year
+# Process data to get birthdays and user details by day of the year.
+# Accepts a loaded {"users": [...]} document, any iterable of user records,
+# or columns from columnarStore.load_columns.
 def get_birthdays_by_day(data):
-    birthdays = defaultdict(list)
-    seen_users = {}  # Dictionary to track users by their twitter_handle
+    columns = user_columns(data, USER_FIELDS, defaults={
+        "twitter_handle": "N/A",
+        "twitter_username": "N/A",
+        "last_price": "N/A",
+    })
 
-    for user in data.get("users", []):
-        created_on = user.get("createdOn")
-        if not created_on:  # Skip if createdOn is null or missing
-            continue
-        
-        # Remove 'Z' from the timestamp to avoid issues with datetime.fromisoformat
-        created_on = created_on.replace("Z", "+00:00")
-        
-        try:
-            date_obj = datetime.fromisoformat(created_on)
-            day_of_year = date_obj.strftime("%B %d")
+    # Parse every timestamp at once; invalid or missing dates get bin -1
+    bins = day_bins(columns["createdOn"])
 
-            # If February 29th is found, move the user to March 1st
-            if day_of_year == "February 29":
-                day_of_year = "March 01"  # Move to March 1st
+    # Keep the first valid row per twitter_handle, grouped by day
+    keep = first_occurrence(columns["twitter_handle"], bins >= 0)
+    order = keep[np.argsort(bins[keep], kind="stable")]
 
-            twitter_handle = user.get("twitter_handle", "N/A")
-            twitter_username = user.get("twitter_username", "N/A")
-            last_price = user.get("last_price", "N/A")  # Assuming 'last_price' exists in the data
-            created_on = user.get("createdOn", "N/A")
-            
-            # Check if the user is already added by their twitter_handle
-            if twitter_handle not in seen_users:
-                user_details = {
-                    "twitter_handle": twitter_handle,
-                    "twitter_username": twitter_username,
-                    "last_price": last_price,
-                    "createdOn": created_on
-                }
-                # Add the user to the day's list
-                birthdays[day_of_year].append(user_details)
-                # Mark the user as seen
-                seen_users[twitter_handle] = True
-
-        except ValueError:
-            # Skip users with invalid dates without logging
-            continue
+    birthdays = defaultdict(list)
+    for index in order.tolist():
+        birthdays[DAY_LABELS[bins[index]]].append({
+            "twitter_handle": columns["twitter_handle"][index],
+            "twitter_username": columns["twitter_username"][index],
+            "last_price": columns["last_price"][index],
+            "createdOn": columns["createdOn"][index]
+        })
 
     return birthdays
 
-# Write birthdays and user details to CSV
+# Write birthdays and user details to CSV, one row per user with the day as a column,
+# plus a per-day byte offset index (see birthdayCsv)
 def write_birthdays_to_csv(birthdays, output_file):
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Day of Year", "Twitter Handle", "Twitter Username", "Last Price", "Created On"])
-
-        valid_days = []
-
-        # Validate and sort days
-        for day in birthdays.keys():
-            try:
-                # Validate date format
-                datetime.strptime(day, "%B %d")
-                valid_days.append(day)
-            except ValueError:
-                continue  # Ignore invalid days
-
-        # Write valid days to CSV
-        for day in sorted(valid_days, key=lambda d: datetime.strptime(d, "%B %d")):
-            writer.writerow([day])
-            for user in birthdays[day]:
-                writer.writerow([
-                    user["twitter_handle"],
-                    user["twitter_username"],
-                    user["last_price"],
-                    user["createdOn"]
-                ])
+    write_birthdays_csv(birthdays, output_file)
 
 # Main function
-def main():
+def main(output_file="birthdays_by_day.csv"):
     input_file = "user_data_with_createdOn.json"  # Replace with your JSON file path
-    output_file = "birthdays_by_day.csv"
+    columnar_dir = "user_data_with_createdOn.columns"  # Columnar snapshot written by fetchBday, used when present
 
-    data = load_json(input_file)
-    birthdays = get_birthdays_by_day(data)
-    write_birthdays_to_csv(birthdays, output_file)
+    with metrics.timer("arena_aggregate_seconds", step="birthdays"):
+        if os.path.isdir(columnar_dir):
+            birthdays = get_birthdays_by_day(load_columns(columnar_dir, USER_FIELDS))
+        else:
+            birthdays = get_birthdays_by_day(iter_users(input_file))
+    with metrics.timer("arena_checkpoint_seconds", kind="csv"):
+        write_birthdays_to_csv(birthdays, output_file)
 
     print(f"CSV file '{output_file}' created successfully.")
 
 if __name__ == "__main__":
-    main()
+    metrics.run_instrumented(main)
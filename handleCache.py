@@ -0,0 +1,74 @@
+import time
+
+from cacheStore import ProcessWide, SqliteCache
+
+CACHE_FILE = "handle_cache.sqlite"
+
+
+class HandleCache(SqliteCache):
+    """
+    Persistent handle -> createdOn cache shared by the enrichment scripts.
+
+    Creation dates never change, so found dates are kept forever. A lookup
+    that found nothing is stored as a negative entry that expires after
+    negative_ttl seconds so it is retried later. An in-memory LRU sits in
+    front of the SQLite table.
+    """
+
+    def __init__(self, filename=CACHE_FILE, negative_ttl=24 * 3600, lru_size=10000):
+        """
+        Args:
+            filename: SQLite database path
+            negative_ttl: Seconds before a negative (None) entry is retried
+            lru_size: Number of entries kept in memory
+        """
+        super().__init__(filename, lru_size)
+        self.negative_ttl = negative_ttl
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS handles ("
+            "handle TEXT PRIMARY KEY, created_on TEXT, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, handle):
+        """
+        Look up a handle.
+
+        Returns:
+            (hit, created_on): hit is False if the handle is unknown or its
+            negative entry has expired
+        """
+        with self._lock:
+            entry = self._lru.get(handle)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT created_on, fetched_at FROM handles WHERE handle = ?", (handle,)
+                ).fetchone()
+                if row is None:
+                    return False, None
+                entry = tuple(row)
+            self._remember(handle, entry)
+
+        created_on, fetched_at = entry
+        if created_on is None and time.time() - fetched_at > self.negative_ttl:
+            return False, None
+        return True, created_on
+
+    def put(self, handle, created_on):
+        """Store the result of a lookup; None records a negative result"""
+        entry = (created_on, time.time())
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO handles (handle, created_on, fetched_at) VALUES (?, ?, ?)",
+                (handle, *entry),
+            )
+            self._db.commit()
+            self._remember(handle, entry)
+
+
+_default_cache = ProcessWide(HandleCache)
+
+
+def get_cache():
+    """Return the process-wide cache, opening it on first use"""
+    return _default_cache.get()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Mapping, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import fastJson
+from cacheStore import ProcessWide, SqliteCache
+
+CACHE_FILE = os.getenv("ARENA_HTTP_CACHE", "http_cache.sqlite")
+
+# Seconds a stored response is served without asking the server again, per endpoint.
+# Both endpoints are revalidated (If-None-Match / If-Modified-Since) on every use:
+# prices and rankings change between crawls, and a user/handle answer without a
+# createdOn has to be asked again by refetchForCreatedOnNull.py (found dates are
+# already kept forever by handleCache). Raise these for endpoints that can be stale.
+FRESHNESS = {
+    "user/handle": 0,
+    "user_summary": 0,
+}
+DEFAULT_FRESHNESS = 0
+
+# Response headers kept with a cached body
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Date")
+
+# Bumped when stored rows change meaning; older tables are dropped on open
+SCHEMA_VERSION = 1
+
+
+class CachedResponse(requests.Response):
+    """
+    A 200 response rebuilt from the cache.
+
+    Every json() call decodes the stored body into new objects, so callers
+    may modify the result without affecting later responses.
+    """
+
+    def __init__(self, url: str, entry: Dict):
+        super().__init__()
+        self.url = url
+        self.status_code = 200
+        self.reason = "OK"
+        self.encoding = "utf-8"
+        self.headers = CaseInsensitiveDict(entry["headers"])
+        self._content = entry["body"]
+        self.from_cache = True
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super().json(**kwargs)
+        return fastJson.loads(self._content)
+
+
+class HttpCache(SqliteCache):
+    """
+    On-disk cache of GET responses with their ETag/Last-Modified validators.
+
+    A response younger than its endpoint's freshness (see FRESHNESS) is served
+    without a request. Older ones are revalidated with a conditional request,
+    and a 304 serves the stored body. Bodies are evicted least recently used
+    first once they add up to more than max_bytes. An in-memory LRU keeps
+    recent entries in front of the SQLite table.
+
+    Entries are stored under key(url, headers), so responses to requests
+    made with different Authorization headers are kept apart.
+    """
+
+    def __init__(self, filename: str = CACHE_FILE, max_bytes: int = 256 * 1024 * 1024,
+                 freshness: Optional[Dict[str, float]] = None, lru_size: int = 1000):
+        """
+        Args:
+            filename (str): SQLite database path
+            max_bytes (int): Upper bound for the stored bodies in bytes
+            freshness (Optional[Dict[str, float]]): Seconds a response stays fresh per endpoint
+                (URL path without slashes at the ends); defaults to FRESHNESS
+            lru_size (int): Number of entries kept in memory
+        """
+        super().__init__(filename, lru_size)
+        self.max_bytes = max_bytes
+        self.freshness = FRESHNESS if freshness is None else freshness
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Rows from before SCHEMA_VERSION 1 were keyed by URL alone, whatever token fetched them
+            self._db.execute("DROP TABLE IF EXISTS responses")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT NOT NULL, body BLOB NOT NULL, "
+            "size INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at);"
+            f"PRAGMA user_version = {SCHEMA_VERSION};"
+        )
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url: str, headers: Optional[Mapping[str, str]] = None) -> str:
+        """Cache key for a GET: its URL, plus a fingerprint of the Authorization header when it has one"""
+        authorization = CaseInsensitiveDict(headers or {}).get("Authorization")
+        if not authorization:
+            return url
+        return f"{url} auth={hashlib.sha256(authorization.encode('utf-8')).hexdigest()[:16]}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Stored entry for a key (etag, last_modified, headers, body, stored_at), or None"""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT etag, last_modified, headers, body, stored_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = {"etag": row[0], "last_modified": row[1], "headers": json.loads(row[2]),
+                         "body": bytes(row[3]), "stored_at": row[4]}
+            self._remember(key, entry)
+            return entry
+
+    def is_fresh(self, endpoint: str, entry: Dict) -> bool:
+        max_age = self.freshness.get(endpoint, DEFAULT_FRESHNESS)
+        return max_age > 0 and time.time() - entry["stored_at"] < max_age
+
+    def conditional_headers(self, entry: Dict) -> Dict[str, str]:
+        """Validator headers that ask the server to answer 304 if the stored body is still current"""
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def storable(self, endpoint: str, response: requests.Response) -> bool:
+        """Whether a response is worth keeping: a 200 that can be revalidated or stays fresh for a while"""
+        if response.status_code != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+            return False
+        return bool(response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    or self.freshness.get(endpoint, DEFAULT_FRESHNESS) > 0)
+
+    def put(self, key: str, response: requests.Response) -> None:
+        """Store a 200 response"""
+        body = response.content
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        now = time.time()
+        entry = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+                 "headers": headers, "body": body, "stored_at": now}
+        with self._lock:
+            row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += len(body) - (row[0] if row else 0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, last_modified, headers, body, size, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, entry["etag"], entry["last_modified"], json.dumps(headers), body, len(body), now, now),
+            )
+            self._remember(key, entry)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def revalidated(self, key: str, entry: Dict) -> None:
+        """Record that the server confirmed a stored body (304), restarting its freshness"""
+        now = time.time()
+        entry["stored_at"] = now
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ?, used_at = ? WHERE key = ?", (now, now, key))
+            self._db.commit()
+
+    def touch(self, key: str) -> None:
+        """Mark a stored response as used, so eviction keeps it longer"""
+        with self._lock:
+            self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+    def _evict(self):
+        # Trim to 90% of the bound so eviction doesn't run on every put
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall()
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._lru.pop(key, None)
+            self.total_bytes -= size
+
+
+_default_cache = ProcessWide(HttpCache)
+
+
+def get_cache() -> Optional[HttpCache]:
+    """Return the process-wide cache, opening it on first use; None if ARENA_HTTP_CACHE is set to "off" """
+    if CACHE_FILE.lower() in ("", "0", "off"):
+        return None
+    return _default_cache.get()
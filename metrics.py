@@ -0,0 +1,221 @@
+"""
+Lightweight counters, histograms and timers for the scrapers.
+
+Every script records into the process-wide registry below: HTTP requests
+(arenaClient), JSON decoding, checkpoint writes and rate-limit waits. The
+registry can be exported as Prometheus text or a JSON summary.
+
+Running a script through run_instrumented() adds two opt-in switches:
+    ARENA_METRICS=metrics.prom   write metrics on exit (.prom/.txt for
+                                 Prometheus text, anything else for JSON)
+    ARENA_PROFILE=cprofile       profile the run with cProfile (or
+                                 "pyinstrument" if it is installed);
+                                 ARENA_PROFILE_OUT sets the output file
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, suited to API round-trips and sleeps
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram that also tracks count, sum, min and max"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Thread-safe registry of named, labelled counters and histograms"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one value (usually seconds) in a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time the body of a with-block into a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{render_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{render_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{render_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{render_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """JSON-friendly summary: counter values plus count/sum/min/max/p50/p99 per histogram"""
+        def label_text(name, labels):
+            return name + "".join(f",{key}={value}" for key, value in labels)
+
+        with self._lock:
+            return {
+                "counters": {label_text(name, labels): value for (name, labels), value in sorted(self._counters.items())},
+                "histograms": {
+                    label_text(name, labels): {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "min": histogram.min,
+                        "max": histogram.max,
+                        "p50": histogram.quantile(0.5),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0])
+                },
+            }
+
+    def write(self, filename):
+        """Write Prometheus text (.prom/.txt) or a JSON summary (anything else)"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            if filename.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+
+    def print_summary(self):
+        """Print where the time went, largest total first"""
+        histograms = self.summary()["histograms"]
+        print(f"{'metric':<60}{'count':>8}{'total s':>10}{'p50 s':>10}{'p99 s':>10}")
+        for name, stats in sorted(histograms.items(), key=lambda item: -item[1]["sum"]):
+            print(f"{name:<60}{stats['count']:>8}{stats['sum']:>10.2f}{stats['p50']:>10.3f}{stats['p99']:>10.3f}")
+
+
+REGISTRY = Metrics()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+
+
+@contextmanager
+def profiled(kind=None, output=None):
+    """
+    Profile the body of a with-block.
+
+    Args:
+        kind: "cprofile", "pyinstrument" or None/"" to do nothing
+        output: File for the profile (default: profile.prof or profile.html)
+    """
+    if not kind:
+        yield
+        return
+
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            output = output or "profile.html"
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            print(f"Profile written to {output}")
+    elif kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = output or "profile.prof"
+            profiler.dump_stats(output)
+            print(f"Profile written to {output} (view with: python -m pstats {output})")
+    else:
+        raise ValueError(f"Unknown profiler: {kind}")
+
+
+def run_instrumented(main):
+    """Run a script's main() with the opt-in profiler and metrics export from the environment"""
+    metrics_file = os.getenv("ARENA_METRICS")
+    try:
+        with profiled(os.getenv("ARENA_PROFILE"), os.getenv("ARENA_PROFILE_OUT")):
+            return main()
+    finally:
+        if metrics_file:
+            REGISTRY.write(metrics_file)
+            REGISTRY.print_summary()
+            print(f"Metrics written to {metrics_file}")
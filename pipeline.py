@@ -0,0 +1,278 @@
+"""
+Streaming scrape -> enrich -> birthday aggregation in one run.
+
+Instead of waiting for ArenaScrap.py to finish before fetchBday.py and
+getBirthday.py start, the three steps run as threads connected by bounded
+queues:
+
+    pages of user_summary  --page queue-->  createdOn lookups (worker pool)
+        --record queue-->  birthday aggregator --> birthdays_by_day.csv
+
+Each page is enriched while later pages are still being fetched, and the
+CSV is rewritten every checkpoint_every seconds, so partial birthdays are
+available minutes into a run. The queues are bounded: when enrichment (one
+request per user) falls behind the pager (one request per 50 users), the
+pager blocks instead of buffering the whole crawl.
+
+Enrichment runs through fetchBday's enrich_into_journal and writes the same
+progress journal, so an interrupted run resumes without repeating lookups.
+Every crawl appends each user again with its new price; the journal is
+rewritten with only the latest records at the end of a run so it doesn't
+grow by a full crawl each time. At the end the usual files are written:
+user_data.json (and its change log / price history),
+user_data_with_createdOn.json and birthdays_by_day.csv.
+
+Usage:
+    python pipeline.py [--total-users 10000] [--workers 8] [--rate 4]
+"""
+import argparse
+import queue
+import threading
+import time
+from collections import defaultdict
+import metrics
+from arenaClient import ARENABOOK_API, ArenaClient
+from birthdayCsv import write_birthdays_csv
+from birthdayDays import DAY_LABELS, record_bins
+from progressJournal import ProgressJournal, rewrite_journal
+from userRecord import UserRecord
+
+# Marks the end of a queue's stream
+_DONE = object()
+
+
+def _put(target, item, stop):
+    """Put an item, blocking while the queue is full; gives up once the pipeline is stopping"""
+    start = time.perf_counter()
+    while True:
+        try:
+            target.put(item, timeout=0.2)
+            break
+        except queue.Full:
+            if stop.is_set():
+                return False
+    waited = time.perf_counter() - start
+    if waited > 0.001:
+        metrics.observe("arena_pipeline_backpressure_seconds", waited)
+    return True
+
+
+def _get(source, stop):
+    """Get the next item, or _DONE when the stream ended or the pipeline is stopping"""
+    while True:
+        try:
+            return source.get(timeout=0.2)
+        except queue.Empty:
+            if stop.is_set():
+                return _DONE
+
+
+class BirthdayAggregator:
+    """
+    Birthdays by day built up from enriched records as they arrive.
+
+    Gives the same result as getBirthday.get_birthdays_by_day on the records
+    in arrival order: the first record with a valid createdOn per handle,
+    in arrival order within each day.
+    """
+
+    def __init__(self):
+        self.birthdays = defaultdict(list)
+        self.users = 0
+        self._handles = set()
+
+    def add(self, records):
+        """Bin a batch of UserRecords"""
+        for record, day in zip(records, record_bins(records).tolist()):
+            handle = record.get("twitter_handle", "N/A")
+            if day < 0 or handle in self._handles:
+                continue
+            self._handles.add(handle)
+            self.birthdays[DAY_LABELS[day]].append({
+                "twitter_handle": handle,
+                "twitter_username": record.get("twitter_username", "N/A"),
+                "last_price": record.get("last_price", "N/A"),
+                "createdOn": record.created_on,
+            })
+            self.users += 1
+
+
+def scrape_stage(base_url, total_users, page_delay, pages, stop, crawl):
+    """Fetch user_summary pages in order onto the page queue as UserRecords, keeping them in crawl for the snapshot"""
+    from ArenaScrap import iter_user_pages
+
+    with ArenaClient(pool_size=2, cache=True) as client:
+        for page in iter_user_pages(base_url, 50, total_users, page_delay, client):
+            page = [UserRecord.from_dict(user) for user in page]
+            crawl.extend(page)
+            if not _put(pages, page, stop):
+                return
+
+
+def enrich_stage(pages, records, stop, journal_file, total_users, workers, rate, known):
+    """
+    Look up createdOn for every user on the page queue, passing records on in crawl order.
+
+    Handles already enriched in the journal (known) reuse its createdOn
+    without a lookup; later duplicates of a handle are dropped. Every record
+    is appended to the journal at its crawl position, so the enriched
+    snapshot gets this crawl's prices.
+    """
+    from fetchBday import enrich_into_journal
+
+    def pending():
+        seen = set()
+        position = 0
+        while True:
+            page = _get(pages, stop)
+            if page is _DONE:
+                return
+            for user in page:
+                position += 1
+                handle = user.get("twitter_handle")
+                if handle:
+                    if handle in seen:
+                        continue
+                    seen.add(handle)
+                yield position, user
+
+    with ProgressJournal(journal_file) as journal:
+        enrich_into_journal(pending(), journal, total_users, workers, rate, known=known,
+                            on_record=lambda _, record: _put(records, record, stop))
+
+
+def aggregate_stage(records, stop, aggregator, output_file, checkpoint_every, progress):
+    """Bin enriched records in batches, rewriting the CSV every checkpoint_every seconds"""
+    last_checkpoint = time.monotonic()
+    while True:
+        record = _get(records, stop)
+        if record is _DONE:
+            break
+        batch = [record]
+        # Take whatever else is ready so createdOn is binned in one vectorized pass
+        while len(batch) < 1000:
+            try:
+                record = records.get_nowait()
+            except queue.Empty:
+                break
+            if record is _DONE:
+                records.put(_DONE)
+                break
+            batch.append(record)
+        with metrics.timer("arena_aggregate_seconds", step="pipeline"):
+            aggregator.add(batch)
+        progress["records"] += len(batch)
+        progress.setdefault("first_record", time.monotonic())
+
+        if time.monotonic() - last_checkpoint >= checkpoint_every:
+            with metrics.timer("arena_checkpoint_seconds", kind="csv"):
+                write_birthdays_csv(aggregator.birthdays, output_file)
+            last_checkpoint = time.monotonic()
+            progress.setdefault("first_csv", last_checkpoint)
+            print(f"Checkpoint: {aggregator.users} birthdays from {progress['records']} users in {output_file}")
+
+
+def run(base_url, total_users=10000, workers=8, rate=4.0, page_delay=0.5, output_file="birthdays_by_day.csv",
+        checkpoint_every=60.0, page_queue_size=4, record_queue_size=500, save=True):
+    """
+    Run the fused pipeline.
+
+    Args:
+        base_url: user_summary URL ordered by last_price (offset is appended per page)
+        total_users: Number of accounts to crawl
+        workers: Number of handles looked up concurrently
+        rate: Initial (and maximum) number of createdOn lookups per second
+        page_delay: Delay between user_summary pages in seconds
+        output_file: Birthdays CSV, rewritten at every checkpoint
+        checkpoint_every: Seconds between CSV checkpoints
+        page_queue_size: Pages buffered between the pager and enrichment
+        record_queue_size: Enriched records buffered before the aggregator
+        save: Also write the snapshot, price history and enriched JSON at the end
+
+    Returns:
+        BirthdayAggregator: The final birthdays by day
+    """
+    from fetchBday import JOURNAL_FILE, journal_created_on, seed_journal
+
+    seed_journal(total_users)
+    known = journal_created_on(JOURNAL_FILE)
+    if known:
+        print(f"Found {len(known)} enriched users in {JOURNAL_FILE}, continuing from there...")
+
+    pages = queue.Queue(maxsize=page_queue_size)
+    records = queue.Queue(maxsize=record_queue_size)
+    stop = threading.Event()
+    errors = []
+    crawl = []
+    aggregator = BirthdayAggregator()
+    progress = {"records": 0}
+    start = time.monotonic()
+
+    def stage(target, downstream, *args):
+        def body():
+            try:
+                target(*args)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                if downstream is not None:
+                    _put(downstream, _DONE, stop)
+        return threading.Thread(target=body, name=target.__name__, daemon=True)
+
+    threads = [
+        stage(scrape_stage, pages, base_url, total_users, page_delay, pages, stop, crawl),
+        stage(enrich_stage, records, pages, records, stop, JOURNAL_FILE, total_users, workers, rate, known),
+        stage(aggregate_stage, None, records, stop, aggregator, output_file, checkpoint_every, progress),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print("\nPipeline interrupted. Enriched users are kept in the journal.")
+        raise
+    if errors:
+        raise errors[0]
+    # Drop the records this crawl superseded
+    rewrite_journal(JOURNAL_FILE)
+
+    with metrics.timer("arena_checkpoint_seconds", kind="csv"):
+        write_birthdays_csv(aggregator.birthdays, output_file)
+    if "first_record" in progress:
+        print(f"First enriched user after {progress['first_record'] - start:.1f}s"
+              + (f", first CSV checkpoint after {progress['first_csv'] - start:.1f}s" if "first_csv" in progress else ""))
+    print(f"Wrote {aggregator.users} birthdays from {progress['records']} users to {output_file} "
+          f"in {time.monotonic() - start:.1f}s")
+
+    if save and crawl:
+        from ArenaScrap import save_crawl
+        from fetchBday import finish_output
+        save_crawl(crawl, columnar_dir="user_data.columns", history_dir="price_history")
+        finish_output()
+    return aggregator
+
+
+def main(total_users=10000, workers=8, rate=4.0, page_delay=0.5, output_file="birthdays_by_day.csv",
+         checkpoint_every=60.0):
+    base_url = f"{ARENABOOK_API}/user_summary?&limit=50&order=last_price.desc.nullslast"
+    print(f"Starting pipelined collection for {total_users} users...")
+    run(base_url, total_users, workers, rate, page_delay, output_file, checkpoint_every)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape, enrich and aggregate birthdays in one streaming run")
+    parser.add_argument("--total-users", type=int, default=10000, help="Number of accounts to fetch")
+    parser.add_argument("--workers", type=int, default=8, help="Handles looked up concurrently")
+    parser.add_argument("--rate", type=float, default=4.0, help="Maximum createdOn lookups per second")
+    parser.add_argument("--page-delay", type=float, default=0.5, help="Seconds between user_summary pages")
+    parser.add_argument("--output", default="birthdays_by_day.csv", help="Birthdays CSV to write")
+    parser.add_argument("--checkpoint-every", type=float, default=60.0, help="Seconds between CSV checkpoints")
+    args = parser.parse_args()
+    metrics.run_instrumented(lambda: main(args.total_users, args.workers, args.rate, args.page_delay,
+                                          args.output, args.checkpoint_every))
@@ -0,0 +1,351 @@
+"""
+Time series of last_price across repeated ArenaScrap crawls.
+
+Every crawl is appended as one gzip segment under price_history/segments/,
+partitioned by day (segments/2025-01-02/1735819200.jsonl.gz). A segment holds
+a header line followed by one [handle, last_price] row per user in crawl
+order, i.e. highest price first, so the top N at a point in time is read from
+the start of a single segment.
+
+price_history/index.sqlite indexes the segments by time, keeps every crawl's
+price per handle so one handle's history is read without opening any
+segment, and keeps daily rollups (open/high/low/close/mean per handle) so
+long-range series don't touch the raw points. Hourly rollups hold about one
+crawl each at the usual crawl cadence, so they are aggregated from the
+handle's points when asked for instead of being stored. Handles are stored
+once and referred to by integer id, and the per-handle tables are clustered
+by that id (WITHOUT ROWID), so the index stays compact. The index is derived
+from the segments and can be rebuilt with `python priceHistory.py rebuild`.
+
+Usage:
+    python priceHistory.py series <handle> [--resolution hour|day] [--since 2025-01-01]
+    python priceHistory.py top [--at "2025-01-02 12:00"] [--top 10]
+    python priceHistory.py rebuild
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sqlite3
+import time
+import metrics
+
+HISTORY_DIR = "price_history"
+ROLLUPS = {"hour": 3600, "day": 86400}
+# Rollups kept in the index; the others are aggregated from the points on request
+STORED_ROLLUPS = ("day",)
+# Bumped when the index layout changes; an older index is rebuilt from the segments
+INDEX_VERSION = 3
+
+
+def _price(value):
+    """last_price as a float, or None when it is missing or not a number"""
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_time(text):
+    """Epoch seconds for "2025-01-02", "2025-01-02 12:00" or "2025-01-02 12:00:00" (local time, like the snapshot timestamp)"""
+    for layout in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(text, layout)))
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {text}")
+
+
+def format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+class PriceHistory:
+    """
+    Append-only price history: gzip segments plus a SQLite index.
+
+    Segments are the record of what each crawl saw; the index answers
+    "top N at time T" by locating the one segment in effect at T, and
+    "one handle over time" from its per-crawl points or rollups.
+    """
+
+    def __init__(self, directory=HISTORY_DIR):
+        """
+        Args:
+            directory: Directory holding segments/ and index.sqlite (created if missing)
+        """
+        self.directory = directory
+        self.segment_dir = os.path.join(directory, "segments")
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        outdated = self._db.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION
+        if outdated:
+            self._db.executescript("DROP TABLE IF EXISTS segments; DROP TABLE IF EXISTS prices; "
+                                   "DROP TABLE IF EXISTS rollups; DROP TABLE IF EXISTS handles; "
+                                   "DROP TABLE IF EXISTS points;")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "ts INTEGER PRIMARY KEY, path TEXT NOT NULL, total_users INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS handles (id INTEGER PRIMARY KEY, handle TEXT NOT NULL UNIQUE);"
+            # One row per crawl a handle appears in; price is NULL when last_price wasn't a number
+            "CREATE TABLE IF NOT EXISTS points ("
+            "handle_id INTEGER NOT NULL, ts INTEGER NOT NULL, price REAL, "
+            "PRIMARY KEY (handle_id, ts)) WITHOUT ROWID;"
+            # resolution is the bucket width in seconds (see STORED_ROLLUPS). A bucket with a single
+            # crawl only stores last_ts and close; the other columns stay NULL until a second one
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            "resolution INTEGER NOT NULL, handle_id INTEGER NOT NULL, bucket INTEGER NOT NULL, "
+            "first_ts INTEGER, open REAL, last_ts INTEGER NOT NULL, close REAL NOT NULL, "
+            "high REAL, low REAL, total REAL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (handle_id, resolution, bucket)) WITHOUT ROWID;"
+            f"PRAGMA user_version = {INDEX_VERSION};"
+        )
+        self._db.commit()
+        if outdated:
+            self.rebuild_index()
+
+    def _segment_path(self, ts):
+        day = time.strftime("%Y-%m-%d", time.gmtime(ts))
+        return os.path.join(self.segment_dir, day, f"{ts}.jsonl.gz")
+
+    def append(self, users, ts=None):
+        """
+        Store one crawl.
+
+        Args:
+            users: User dictionaries in crawl order (last_price descending)
+            ts: Crawl time in epoch seconds (defaults to now, or the next
+                free second if a crawl was already recorded this second)
+
+        Returns:
+            int: The crawl's timestamp
+        """
+        if ts is None:
+            ts = int(time.time())
+            while self._db.execute("SELECT 1 FROM segments WHERE ts = ?", (ts,)).fetchone():
+                ts += 1
+        elif self._db.execute("SELECT 1 FROM segments WHERE ts = ?", (int(ts),)).fetchone():
+            raise ValueError(f"A crawl is already recorded at {format_time(ts)}")
+        ts = int(ts)
+        rows = []
+        seen = set()
+        for user in users:
+            handle = user.get("twitter_handle")
+            if handle and handle not in seen:
+                seen.add(handle)
+                rows.append((handle, _price(user.get("last_price"))))
+
+        path = self._segment_path(ts)
+        with metrics.timer("arena_checkpoint_seconds", kind="history"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_file = path + ".tmp"
+            with gzip.open(temp_file, 'wt', encoding='utf-8') as f:
+                f.write(json.dumps({"timestamp": ts, "total_users": len(rows)}) + "\n")
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            os.replace(temp_file, path)
+            self._index_segment(ts, path, rows)
+        return ts
+
+    def _handle_ids(self, handles):
+        """Integer ids for handles, adding the ones not seen before"""
+        self._db.executemany("INSERT OR IGNORE INTO handles (handle) VALUES (?)", ((handle,) for handle in handles))
+        ids = dict(self._db.execute("SELECT handle, id FROM handles"))
+        return [ids[handle] for handle in handles]
+
+    def _handle_id(self, handle):
+        row = self._db.execute("SELECT id FROM handles WHERE handle = ?", (handle,)).fetchone()
+        return row[0] if row else None
+
+    def _index_segment(self, ts, path, rows):
+        with self._db:
+            self._db.execute("INSERT INTO segments (ts, path, total_users) VALUES (?, ?, ?)",
+                             (ts, os.path.relpath(path, self.directory), len(rows)))
+            ids = self._handle_ids([handle for handle, _ in rows])
+            self._db.executemany("INSERT INTO points (handle_id, ts, price) VALUES (?, ?, ?)",
+                                 ((handle_id, ts, price) for handle_id, (_, price) in zip(ids, rows)))
+            for width in (ROLLUPS[name] for name in STORED_ROLLUPS):
+                bucket = ts - ts % width
+                # open/close follow the earliest/latest crawl in the bucket, so backfilled segments roll up
+                # correctly; NULLs of a single-crawl bucket stand for its one price and timestamp
+                self._db.executemany(
+                    "INSERT INTO rollups (resolution, handle_id, bucket, last_ts, close, count) "
+                    "VALUES (?, ?, ?, ?, ?, 1) "
+                    "ON CONFLICT (handle_id, resolution, bucket) DO UPDATE SET "
+                    "open = CASE WHEN excluded.last_ts < coalesce(first_ts, last_ts) THEN excluded.close "
+                    "ELSE coalesce(open, close) END, "
+                    "first_ts = min(coalesce(first_ts, last_ts), excluded.last_ts), "
+                    "close = CASE WHEN excluded.last_ts >= last_ts THEN excluded.close ELSE close END, "
+                    "last_ts = max(last_ts, excluded.last_ts), "
+                    "high = max(coalesce(high, close), excluded.close), low = min(coalesce(low, close), excluded.close), "
+                    "total = coalesce(total, close) + excluded.close, count = count + 1",
+                    ((width, handle_id, bucket, ts, price) for handle_id, (_, price) in zip(ids, rows) if price is not None),
+                )
+
+    def rebuild_index(self):
+        """Recreate the index from the segments on disk, e.g. after deleting index.sqlite"""
+        with self._db:
+            self._db.execute("DELETE FROM segments")
+            self._db.execute("DELETE FROM rollups")
+            self._db.execute("DELETE FROM points")
+            self._db.execute("DELETE FROM handles")
+        count = 0
+        for path in sorted(glob.glob(os.path.join(self.segment_dir, "*", "*.jsonl.gz"))):
+            header, rows = None, []
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if header is None:
+                        header = json.loads(line)
+                    else:
+                        rows.append(tuple(json.loads(line)))
+            self._index_segment(header["timestamp"], path, rows)
+            count += 1
+        return count
+
+    def timestamps(self, start=None, end=None):
+        """Crawl times between start and end (epoch seconds, inclusive)"""
+        return [ts for (ts,) in self._db.execute(
+            "SELECT ts FROM segments WHERE ts BETWEEN ? AND ? ORDER BY ts",
+            (start if start is not None else 0, end if end is not None else 2 ** 62))]
+
+    def series(self, handle, start=None, end=None, resolution=None):
+        """
+        One handle's prices over time.
+
+        Args:
+            handle: Twitter handle
+            start, end: Optional bounds in epoch seconds (inclusive)
+            resolution: None for every crawl, or "hour"/"day" for rollups
+
+        Both come from the index alone; no segment is opened.
+
+        Returns:
+            List[Tuple]: (ts, price) per crawl, or with a resolution
+            (bucket, open, high, low, close, mean, crawls) per bucket
+        """
+        start = start if start is not None else 0
+        end = end if end is not None else 2 ** 62
+        if resolution is not None and resolution not in ROLLUPS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        handle_id = self._handle_id(handle)
+        if handle_id is None:
+            return []
+        if resolution is None:
+            return self._db.execute(
+                "SELECT ts, price FROM points WHERE handle_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (handle_id, start, end)).fetchall()
+        width = ROLLUPS[resolution]
+        if resolution not in STORED_ROLLUPS:
+            return self._aggregate_points(handle_id, width, start, end)
+        return self._db.execute(
+            "SELECT bucket, coalesce(open, close), coalesce(high, close), coalesce(low, close), close, "
+            "coalesce(total, close) / count, count FROM rollups "
+            "WHERE handle_id = ? AND resolution = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+            (handle_id, width, start - start % width, end)).fetchall()
+
+    def _aggregate_points(self, handle_id, width, start, end):
+        """Rollup rows, as series returns them, computed from a handle's points"""
+        buckets = []
+        for ts, price in self._db.execute(
+                "SELECT ts, price FROM points WHERE handle_id = ? AND ts BETWEEN ? AND ? AND price IS NOT NULL "
+                "ORDER BY ts", (handle_id, start - start % width, end - end % width + width - 1)):
+            bucket = ts - ts % width
+            if buckets and buckets[-1][0] == bucket:
+                row = buckets[-1]
+                row[2], row[3], row[4] = max(row[2], price), min(row[3], price), price
+                row[5] += price
+                row[6] += 1
+            else:
+                buckets.append([bucket, price, price, price, price, price, 1])
+        return [(bucket, open_, high, low, close, total / count, count)
+                for bucket, open_, high, low, close, total, count in buckets]
+
+    def top(self, at=None, limit=10):
+        """
+        The highest priced users as of a point in time.
+
+        Only the latest segment at or before `at` is read, and only as far
+        as the first `limit` rows.
+
+        Returns:
+            Tuple[int, List[Tuple]]: The crawl's timestamp (None if there was no
+            crawl yet) and its first `limit` (handle, price) rows
+        """
+        row = self._db.execute("SELECT ts, path FROM segments WHERE ts <= ? ORDER BY ts DESC LIMIT 1",
+                               (at if at is not None else 2 ** 62,)).fetchone()
+        if row is None:
+            return None, []
+        ts, path = row
+        users = []
+        with gzip.open(os.path.join(self.directory, path), 'rt', encoding='utf-8') as f:
+            next(f)  # header
+            for line in f:
+                if len(users) >= limit:
+                    break
+                users.append(tuple(json.loads(line)))
+        return ts, users
+
+    def close(self):
+        self._db.close()
+
+
+def record_snapshot(users, directory=HISTORY_DIR, ts=None):
+    """Append one crawl to the price history in directory"""
+    history = PriceHistory(directory)
+    try:
+        ts = history.append(users, ts)
+    finally:
+        history.close()
+    print(f"Recorded prices of {len(users)} users at {format_time(ts)} in {directory}")
+    return ts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the last_price history of Arena accounts")
+    parser.add_argument("--dir", default=HISTORY_DIR, help="Price history directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    series = commands.add_parser("series", help="One account's price over time")
+    series.add_argument("handle")
+    series.add_argument("--resolution", choices=sorted(ROLLUPS), help="Hourly or daily rollups instead of every crawl")
+    series.add_argument("--since", help='Start time, e.g. "2025-01-01" or "2025-01-01 12:00"')
+    series.add_argument("--until", help="End time")
+    top = commands.add_parser("top", help="Highest priced accounts at a point in time")
+    top.add_argument("--at", help="Time to look at (defaults to the latest crawl)")
+    top.add_argument("--top", type=int, default=10, help="Number of accounts")
+    commands.add_parser("rebuild", help="Rebuild the index from the segments")
+    args = parser.parse_args()
+
+    history = PriceHistory(args.dir)
+    try:
+        if args.command == "series":
+            start = parse_time(args.since) if args.since else None
+            end = parse_time(args.until) if args.until else None
+            rows = history.series(args.handle, start, end, args.resolution)
+            if not rows:
+                print(f"No prices recorded for {args.handle}")
+            for ts, *values in rows:
+                if args.resolution:
+                    open_, high, low, close, mean, count = values
+                    print(f"{format_time(ts)}  open {open_}  high {high}  low {low}  close {close}  "
+                          f"mean {mean:.6g}  ({count} crawls)")
+                else:
+                    print(f"{format_time(ts)}  {values[0]}")
+        elif args.command == "top":
+            ts, users = history.top(parse_time(args.at) if args.at else None, args.top)
+            if ts is None:
+                print("No crawls recorded yet")
+                return
+            print(f"Top {len(users)} as of the crawl at {format_time(ts)}:")
+            for rank, (handle, price) in enumerate(users, 1):
+                print(f"  {rank}. {handle} - last price {price}")
+        elif args.command == "rebuild":
+            print(f"Indexed {history.rebuild_index()} segments")
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import os
+import fastJson
+import metrics
+from userStream import write_users
+
+
+class ProgressJournal:
+    """
+    Append-only JSONL journal of enriched user records.
+
+    The first line holds the document header (total_users, timestamp, ...),
+    every following line holds one user record, optionally with the user's
+    1-based position in the snapshot it came from. Writes are buffered and
+    fsynced in batches, so a crash loses at most the last unsynced batch and
+    never corrupts records that were already on disk.
+    """
+
+    def __init__(self, filename, fsync_every=10):
+        """
+        Args:
+            filename: Journal file path (created if missing)
+            fsync_every: Number of appended records between fsyncs
+        """
+        self.filename = filename
+        self.fsync_every = fsync_every
+        self.pending = 0
+        self._repair()
+        self._file = open(filename, 'a', encoding='utf-8')
+
+    def _repair(self):
+        """Drop a torn final line left behind by a crash mid-write"""
+        try:
+            with open(self.filename, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b"\n":
+                    return
+                # Walk back to the last complete line
+                position = size
+                while position > 0:
+                    step = min(4096, position)
+                    position -= step
+                    f.seek(position)
+                    newline = f.read(step).rfind(b"\n")
+                    if newline != -1:
+                        f.truncate(position + newline + 1)
+                        return
+                f.truncate(0)
+        except FileNotFoundError:
+            pass
+
+    def is_empty(self):
+        return self._file.tell() == 0
+
+    def write_header(self, header):
+        """Write the document header; only valid on an empty journal"""
+        self._write({"header": header})
+
+    def append(self, user, index=None):
+        """Append one user record, fsyncing once a batch is complete
+
+        index is the user's position in its snapshot; the compacted document
+        lists users in that order, whatever order they were appended in.
+        """
+        self._write({"user": user} if index is None else {"user": user, "index": index})
+
+    def _write(self, record):
+        self._file.write(fastJson.dumps(record) + "\n")
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk"""
+        with metrics.timer("arena_checkpoint_seconds", kind="journal_sync"):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _iter_lines(filename, offset=0):
+    """Yield (record, start, end) for every complete line, stopping at a torn final line"""
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            start, offset = offset, offset + len(line)
+            try:
+                record = fastJson.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                break
+            yield record, start, offset
+
+
+def iter_journal(filename, offset=0):
+    """
+    Yield ("header", dict, end) and ("user", dict, end) records from a journal.
+
+    end is the byte offset just past the record, so a reader can resume from
+    there later. Reading stops at a torn final line.
+    """
+    for record, _, end in _iter_lines(filename, offset):
+        for kind in ("header", "user"):
+            if kind in record:
+                yield kind, record[kind], end
+
+
+def read_journal_header(filename):
+    """Return the journal's header record ({} if it has none)"""
+    for kind, value, _ in iter_journal(filename):
+        return value if kind == "header" else {}
+    return {}
+
+
+def iter_current_users(filename, with_index=False):
+    """
+    Yield the current version of every user in a journal, in snapshot order.
+
+    Users are ordered by the snapshot position they were appended with (see
+    ProgressJournal.append), so a journal filled out of order, by priority
+    or by merged shards, still compacts in snapshot order. Records without a
+    position come first, in journal order. Positions from runs against
+    different snapshots interleave, and ties keep journal order.
+
+    A handle may be appended again later (for example by the next pipeline
+    crawl, or when the null refetch finds its createdOn); the latest record
+    then replaces the earlier one and is ordered by its own position, or by
+    the earlier record's when it was appended without one. Only positions
+    and byte offsets are held in memory; records are read back from the
+    journal one at a time.
+
+    Args:
+        filename: Journal file path
+        with_index: Yield (position, user) pairs instead of users (position
+            None for records without one)
+    """
+    # handle -> [position, sequence, byte offset] of its latest record; handleless records are kept apart
+    current, handleless = {}, []
+    for sequence, (record, start, _) in enumerate(_iter_lines(filename)):
+        if "user" not in record:
+            continue
+        handle = record["user"].get('twitter_handle')
+        index = record.get("index")
+        if not handle:
+            handleless.append([index, sequence, start])
+            continue
+        entry = current.get(handle)
+        if entry is None:
+            current[handle] = [index, sequence, start]
+            continue
+        if index is not None:
+            entry[0], entry[1] = index, sequence
+        entry[2] = start
+
+    entries = sorted((0 if index is None else index, sequence, start, index)
+                     for index, sequence, start in [*current.values(), *handleless])
+    with open(filename, 'rb') as f:
+        for _, _, start, index in entries:
+            f.seek(start)
+            user = fastJson.loads(f.readline())["user"]
+            yield (index, user) if with_index else user
+
+
+def rewrite_journal(filename):
+    """
+    Rewrite a journal in place with only the current record of every user.
+
+    Superseded records (a handle appended again, e.g. by every pipeline
+    crawl) are dropped and positions are kept, so the journal compacts to
+    the same document. The new journal is written through a temp file and
+    fsynced once.
+
+    Byte offsets into the old journal don't point at records of the new one,
+    so the header's "generation" is bumped; readers that resume from a saved
+    offset (refetchForCreatedOnNull, birthdayIndex) start over when the
+    header changes.
+
+    Returns:
+        int: Number of user records kept, or None if there is no journal
+    """
+    try:
+        header = read_journal_header(filename)
+    except FileNotFoundError:
+        return None
+    header = {**header, "generation": header.get("generation", 0) + 1}
+    count = 0
+    tmp_filename = f"{filename}.tmp"
+    with metrics.timer("arena_checkpoint_seconds", kind="journal_rewrite"):
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(fastJson.dumps({"header": header}) + "\n")
+            for index, user in iter_current_users(filename, with_index=True):
+                f.write(fastJson.dumps({"user": user} if index is None else {"user": user, "index": index}) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+    return count
+
+
+def write_json_atomic(data, filename):
+    """Write a JSON document through a temp file so readers never see a partial file"""
+    tmp_filename = f"{filename}.tmp"
+    with metrics.timer("arena_checkpoint_seconds", kind="json_document"):
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            fastJson.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+
+
+def compact_journal(journal_filename, output_filename):
+    """
+    Stream a journal into the final JSON document.
+
+    Returns:
+        int: Number of user records written, or None if there is no journal
+    """
+    try:
+        header = read_journal_header(journal_filename)
+    except FileNotFoundError:
+        return None
+    # The rewrite generation only concerns readers of the journal itself
+    header.pop("generation", None)
+    with metrics.timer("arena_checkpoint_seconds", kind="compact"):
+        return write_users(output_filename, header, iter_current_users(journal_filename))
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import metrics
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header into a number of seconds.
+
+    Args:
+        value (Optional[str]): Header value, either delta-seconds or an HTTP-date
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+# Statuses that mean "slow down"; other 5xx responses are plain server errors
+THROTTLE_STATUSES = (429, 503)
+
+
+def is_throttled(response) -> bool:
+    """Whether a response asks the client to slow down: 429/503, or any error carrying Retry-After"""
+    status = response.status_code
+    return status in THROTTLE_STATUSES or (status >= 400 and bool(response.headers.get("Retry-After")))
+
+
+def is_retryable(response) -> bool:
+    """Whether a request is worth sending again: throttled, or a transient 5xx server error"""
+    return is_throttled(response) or response.status_code >= 500
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket whose refill rate adapts to server feedback.
+
+    The rate grows additively after successful requests and shrinks
+    multiplicatively on throttling responses (see is_throttled), at most once
+    per second so a burst of throttled requests that were in flight together
+    counts as one event. A Retry-After value blocks every caller until it has
+    elapsed. Other server errors are retried at the current rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.2,
+                 max_rate: Optional[float] = None, increase: float = 0.1, backoff: float = 0.5):
+        """
+        Args:
+            rate (float): Initial number of requests allowed per second
+            capacity (float): Maximum burst size in requests
+            min_rate (float): Lower bound for the rate after repeated throttling
+            max_rate (Optional[float]): Upper bound for the rate (default: initial rate)
+            increase (float): Requests per second added after each success
+            backoff (float): Factor applied to the rate when throttled
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.backoff = backoff
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_backoff = float("-inf")
+        self._lock = threading.Lock()
+        self.requests = 0  # Tokens handed out so far, i.e. requests sent through this bucket
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            self.requests += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self) -> None:
+        """Block the current thread until a request may be sent"""
+        wait = self.reserve()
+        metrics.observe("arena_ratelimit_wait_seconds", wait, limiter="token_bucket")
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Suspend the current task until a request may be sent"""
+        wait = self.reserve()
+        metrics.observe("arena_ratelimit_wait_seconds", wait, limiter="token_bucket")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self) -> None:
+        """Slowly raise the rate after a successful request"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Cut the rate after a 429/503 response and honour Retry-After if given"""
+        metrics.inc("arena_throttled_total")
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_backoff >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+                self._last_backoff = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def on_error(self) -> None:
+        """Count a retryable server error (5xx without Retry-After) without cutting the rate"""
+        metrics.inc("arena_server_errors_total")
@@ -1,96 +1,92 @@
-import json
-import requests
-import time
-from datetime import datetime
-import sys
-from dotenv import load_dotenv
 import os
+import sys
+from datetime import datetime
+import metrics
+from fetchBday import JOURNAL_FILE, lookup_creation_date
+from progressJournal import ProgressJournal, compact_journal, iter_journal, read_journal_header
+from rateLimiter import TokenBucket
+from retryQueue import QUEUE_FILE, RetryQueue
+from userStream import iter_users, read_header
 
-load_dotenv()
 
-AUTH_TOKEN = os.getenv("AUTH_TOKEN")
+def seed_journal(input_file, journal_file):
+    """Create the progress journal from an enriched JSON document"""
+    with ProgressJournal(journal_file, fsync_every=1000) as journal:
+        journal.write_header(read_header(input_file))
+        for user in iter_users(input_file):
+            journal.append(user)
 
+def scan_journal(queue, journal_file):
+    """Queue users with null createdOn appended to the journal since the last scan"""
+    offset = queue.get_meta("journal_offset", 0)
+    header = read_journal_header(journal_file)
+    if offset > os.path.getsize(journal_file) or header != queue.get_meta("journal_header", header):
+        offset = 0  # The journal was recreated or rewritten; scan it from the start
 
-def load_existing_data(filename="user_data_with_createdOn.json"):
-    """Load the user data with createdOn field."""
-    with open(filename, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    for kind, user, end in iter_journal(journal_file, offset):
+        twitter_handle = user.get("twitter_handle") if kind == "user" else None
+        if twitter_handle:
+            if user.get("createdOn") is None:
+                queue.add(twitter_handle, user)
+            else:
+                queue.resolve(twitter_handle)
+        offset = end
 
-def save_new_data(data, filename="newFinal.json"):
-    """Save updated data to a new JSON file."""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    queue.set_meta("journal_offset", offset)
+    queue.set_meta("journal_header", header)
+    queue.commit()
 
-def fetch_creation_date(twitter_handle):
-    """Fetch creation date for a user from the API."""
-    if not twitter_handle:
-        return None
+def process_null_createdOn_users(input_file="user_data_with_createdOn.json", output_file="newFinal.json",
+                                 journal_file=JOURNAL_FILE, queue_file=QUEUE_FILE, rate=1.0):
+    # Updates are appended to the progress journal, seeded from the input file if needed
+    print("Loading user data...")
+    if not os.path.exists(journal_file):
+        seed_journal(input_file, journal_file)
 
-    url = f"https://api.starsarena.com/user/handle?handle={twitter_handle}"
-    
-    try:
-        headers = {
-            "Authorization": f"Bearer {AUTH_TOKEN}",
-            "Content-Type": "application/json",
-            "Referer": "https://arena.social/",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+    # Only journal records added since the last run are scanned for null createdOn
+    queue = RetryQueue(queue_file)
+    scan_journal(queue, journal_file)
+    due = queue.due()
 
-        return data.get('user', {}).get('createdOn')
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data for {twitter_handle}: {str(e)}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error parsing response for {twitter_handle}: {str(e)}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {str(e)}")
-        return None
+    print(f"Found {len(due)} users with null createdOn due for a retry.")
 
-def process_null_createdOn_users():
-    # Load existing data
-    print("Loading user data...")
-    data = load_existing_data()
-    users = data.get("users", [])
-    
-    # Process users with null createdOn
-    updated_users = []
-    total_users = len(users)
-    null_createdOn_users = [user for user in users if user.get("createdOn") is None]
+    # One request per second by default; handles answered from the cache don't wait
+    limiter = TokenBucket(rate)
+    fixed = 0
 
-    print(f"Found {len(null_createdOn_users)} users with null createdOn.")
-    
-    for i, user in enumerate(null_createdOn_users, 1):
-        twitter_handle = user.get("twitter_handle")
-        print(f"Processing {i}/{len(null_createdOn_users)}: {twitter_handle or 'No handle'}")
+    with ProgressJournal(journal_file) as journal:
+        for i, (twitter_handle, user) in enumerate(due, 1):
+            print(f"Processing {i}/{len(due)}: {twitter_handle}")
 
-        if twitter_handle:
-            # Add delay to avoid rate limiting
-            time.sleep(1)
-            
-            # Fetch creation date
-            created_on = fetch_creation_date(twitter_handle)
+            # Fetch creation date, ignoring cached misses since this is the retry pass
+            created_on, status = lookup_creation_date(twitter_handle, limiter=limiter, use_negative=False)
             if created_on:
-                user["createdOn"] = created_on
+                journal.append({**user, "createdOn": created_on})
+                journal.sync()
+                queue.record_success(twitter_handle)
+                fixed += 1
                 print(f"Found creation date: {created_on}")
             else:
-                print("Could not fetch creation date")
-        else:
-            print("No Twitter handle available")
-        
-        updated_users.append(user)
-    
-    # Save updated data
-    data["users"] = users
-    save_new_data(data)
-    print(f"Updated data saved to 'newFinal.json'.")
+                queue.record_failure(twitter_handle, status, permanent=status == "not_found")
+                print(f"Could not fetch creation date ({status})")
+
+    counts = queue.counts()
+    next_attempt_at = queue.next_attempt_at()
+    queue.close()
+    print(f"Fixed {fixed} users; {counts.get('pending', 0)} pending retry, "
+          f"{counts.get('permanent', 0)} permanently failed.")
+    if next_attempt_at:
+        print(f"Next retry due at {datetime.fromtimestamp(next_attempt_at).strftime('%Y-%m-%d %H:%M:%S')}.")
+
+    # Only the fixed records are written to the journal; the output document is a
+    # streamed compaction of it, rebuilt only when something changed
+    if fixed or not os.path.exists(output_file):
+        compact_journal(journal_file, output_file)
+        print(f"Updated data saved to '{output_file}'.")
 
-def main():
+def main(rate=1.0):
     try:
-        process_null_createdOn_users()
+        process_null_createdOn_users(rate=rate)
     except KeyboardInterrupt:
         print("\nScript interrupted by user.")
         sys.exit(0)
@@ -101,4 +97,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    metrics.run_instrumented(main)
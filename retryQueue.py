@@ -0,0 +1,101 @@
+import json
+import random
+import sqlite3
+import time
+
+QUEUE_FILE = "refetch_queue.sqlite"
+
+
+class RetryQueue:
+    """
+    Persistent queue of handles whose createdOn still has to be refetched.
+
+    Each handle keeps its attempt count and the earliest time it may be
+    retried. Transient failures are rescheduled with exponential backoff and
+    jitter; permanent failures (deleted accounts) and handles that keep
+    failing past max_attempts are parked so later runs skip them.
+    """
+
+    def __init__(self, filename=QUEUE_FILE, base_delay=60.0, max_delay=24 * 3600.0, max_attempts=8):
+        """
+        Args:
+            filename: SQLite database path
+            base_delay: Seconds before the first retry
+            max_delay: Upper bound for the backoff delay in seconds
+            max_attempts: Failed attempts before a handle is parked as permanent
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(filename)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            "handle TEXT PRIMARY KEY, record TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, next_attempt_at REAL NOT NULL, last_error TEXT);"
+            "CREATE INDEX IF NOT EXISTS queue_due ON queue (status, next_attempt_at);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        self._db.commit()
+
+    def add(self, handle, record):
+        """Queue a handle for refetching unless it is already tracked"""
+        self._db.execute(
+            "INSERT OR IGNORE INTO queue (handle, record, status, attempts, next_attempt_at) "
+            "VALUES (?, ?, 'pending', 0, ?)",
+            (handle, json.dumps(record, ensure_ascii=False), time.time()),
+        )
+
+    def resolve(self, handle):
+        """Mark a queued handle as done, e.g. when a later record already has its createdOn"""
+        self._db.execute("UPDATE queue SET status = 'done' WHERE handle = ? AND status = 'pending'", (handle,))
+
+    def due(self, now=None):
+        """Return (handle, record) pairs whose next attempt is due, oldest first"""
+        rows = self._db.execute(
+            "SELECT handle, record FROM queue WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at",
+            (time.time() if now is None else now,),
+        ).fetchall()
+        return [(handle, json.loads(record)) for handle, record in rows]
+
+    def record_success(self, handle):
+        self._db.execute("UPDATE queue SET status = 'done', last_error = NULL WHERE handle = ?", (handle,))
+        self._db.commit()
+
+    def record_failure(self, handle, error, permanent=False):
+        """Reschedule a handle with backoff, or park it if the failure is permanent"""
+        attempts = self._db.execute("SELECT attempts FROM queue WHERE handle = ?", (handle,)).fetchone()[0] + 1
+        if permanent or attempts >= self.max_attempts:
+            self._db.execute(
+                "UPDATE queue SET status = 'permanent', attempts = ?, last_error = ? WHERE handle = ?",
+                (attempts, error, handle),
+            )
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+            self._db.execute(
+                "UPDATE queue SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE handle = ?",
+                (attempts, time.time() + delay, error, handle),
+            )
+        self._db.commit()
+
+    def counts(self):
+        """Number of handles per status"""
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall())
+
+    def next_attempt_at(self):
+        """Earliest scheduled retry, or None if nothing is pending"""
+        return self._db.execute("SELECT MIN(next_attempt_at) FROM queue WHERE status = 'pending'").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
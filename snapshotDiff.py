@@ -0,0 +1,147 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import fastJson
+from userRecord import UserRecord
+from userStream import iter_users, read_header
+
+CHANGE_LOG_FILE = "user_data_changes.jsonl"
+
+
+def _price_key(user: Dict) -> float:
+    price = user.get("last_price")
+    try:
+        return -float(price)
+    except (TypeError, ValueError):
+        return float("inf")  # nullslast
+
+
+def _as_dict(user) -> Dict:
+    return user.to_dict() if isinstance(user, UserRecord) else user
+
+
+def diff_snapshots(old_users: List[Dict], new_users: List[Dict], key: str = "twitter_handle") -> Dict:
+    """
+    Compares two crawls of user_summary by handle.
+
+    Args:
+        old_users (List[Dict]): Users from the previous snapshot
+        new_users (List[Dict]): Users from the new crawl
+        key (str): Field identifying a user
+
+    Returns:
+        Dict: Change record with "added" (full user dicts), "changed" (handle -> changed
+        fields), "unset" (handle -> removed fields), "removed" (handles) and, when users
+        without a handle changed, "unkeyed" (the new list of such users)
+    """
+    old_by_key = {user[key]: user for user in old_users if user.get(key)}
+    new_keys = set()
+    added, changed, unset = [], {}, {}
+
+    for user in new_users:
+        handle = user.get(key)
+        if not handle:
+            continue
+        new_keys.add(handle)
+        previous = old_by_key.get(handle)
+        if previous is None:
+            added.append(user)
+            continue
+        fields = {field: value for field, value in user.items() if previous.get(field, object()) != value}
+        if fields:
+            changed[handle] = fields
+        missing = [field for field in previous if field not in user]
+        if missing:
+            unset[handle] = missing
+
+    changes = {
+        "added": added,
+        "changed": changed,
+        "unset": unset,
+        "removed": [handle for handle in old_by_key if handle not in new_keys],
+    }
+    # Either side may hold UserRecords, which don't compare equal to dictionaries
+    old_unkeyed = [_as_dict(user) for user in old_users if not user.get(key)]
+    new_unkeyed = [_as_dict(user) for user in new_users if not user.get(key)]
+    if old_unkeyed != new_unkeyed:
+        changes["unkeyed"] = new_unkeyed
+    return changes
+
+
+def has_changes(changes: Dict) -> bool:
+    return any(changes.get(field) for field in ("added", "changed", "unset", "removed")) or "unkeyed" in changes
+
+
+def apply_changes(users: List[Dict], changes: Dict, key: str = "twitter_handle", make=None) -> List[Dict]:
+    """
+    Applies one change record to a list of users.
+
+    The result is ordered by last_price descending (nulls last), matching the
+    order of the user_summary crawl; ties keep their previous order. make,
+    e.g. UserRecord.from_dict, builds every added or updated user from its
+    dictionary; by default they stay dictionaries.
+    """
+    removed = set(changes.get("removed", []))
+    result = []
+    for user in users:
+        handle = user.get(key)
+        if not handle:
+            if "unkeyed" not in changes:
+                result.append(user)
+            continue
+        if handle in removed:
+            continue
+        if handle in changes.get("changed", {}) or handle in changes.get("unset", {}):
+            user = {**user, **changes.get("changed", {}).get(handle, {})}
+            for field in changes.get("unset", {}).get(handle, []):
+                user.pop(field, None)
+            user = make(user) if make else user
+        result.append(user)
+    result.extend(map(make, changes.get("added", [])) if make else changes.get("added", []))
+    result.extend(map(make, changes.get("unkeyed", [])) if make else changes.get("unkeyed", []))
+    result.sort(key=_price_key)
+    return result
+
+
+def append_changes(changes: Dict, filename: str = CHANGE_LOG_FILE, timestamp: Optional[str] = None) -> None:
+    """Appends one change record as a line of the change log"""
+    record = {"timestamp": timestamp or time.strftime("%Y-%m-%d %H:%M:%S"), **changes}
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(fastJson.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_changes(filename: str = CHANGE_LOG_FILE) -> Iterable[Dict]:
+    """Yields change records in the order they were logged, skipping a torn final line"""
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                yield fastJson.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def current_snapshot(base_file: str = "user_data.json", log_file: str = CHANGE_LOG_FILE) -> Tuple[Dict, Iterable[Dict]]:
+    """
+    Returns the header and users of the latest snapshot.
+
+    Without a change log the base file is streamed as-is. Otherwise every
+    logged change is replayed on top of the base snapshot, which is held as
+    compact UserRecords (see userRecord) rather than dictionaries.
+
+    Returns:
+        Tuple[Dict, Iterable[Dict]]: Header (total_users, timestamp) and users
+    """
+    header = read_header(base_file)
+    if not os.path.exists(log_file):
+        return header, iter_users(base_file)
+
+    users = [UserRecord.from_dict(user) for user in iter_users(base_file)]
+    for changes in iter_changes(log_file):
+        users = apply_changes(users, changes, make=UserRecord.from_dict)
+        header = {**header, "total_users": len(users), "timestamp": changes["timestamp"]}
+    return header, users
@@ -0,0 +1,200 @@
+import calendar
+import sys
+import time
+
+HANDLE = "twitter_handle"
+USERNAME = "twitter_username"
+LAST_PRICE = "last_price"
+CREATED_ON = "createdOn"
+
+# Layout of the API's createdOn values, e.g. "2025-01-01T20:23:15.210Z"
+_CANONICAL_LENGTH = len("0000-00-00T00:00:00.000Z")
+
+
+def parse_created_on(value):
+    """Epoch milliseconds for a canonical createdOn string, or None if it wouldn't format back identically"""
+    if not isinstance(value, str) or len(value) != _CANONICAL_LENGTH or value[-1] != "Z":
+        return None
+    try:
+        seconds = calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                   int(value[11:13]), int(value[14:16]), int(value[17:19])))
+        ms = seconds * 1000 + int(value[20:23])
+    except ValueError:
+        return None
+    # timegm normalises out-of-range fields (month 13, ...); reject those
+    return ms if format_created_on(ms) == value else None
+
+
+def format_created_on(ms):
+    """The API's createdOn string for epoch milliseconds"""
+    seconds, millis = divmod(ms, 1000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{millis:03d}Z"
+
+
+class Layout:
+    """
+    Shape of a user dictionary: its key order and where each value is kept.
+
+    kinds[i] says how keys[i] is stored: "handle", "username", "price",
+    "price_str" (a numeric string parsed into last_price), "created"
+    (epoch ms in created_on_ms) or "extra" (verbatim in the extras tuple).
+    Records with the same shape share one Layout.
+    """
+
+    __slots__ = ("keys", "kinds", "kind_of", "extra_keys")
+
+    def __init__(self, keys, kinds):
+        self.keys = keys
+        self.kinds = kinds
+        self.kind_of = dict(zip(keys, kinds))
+        self.extra_keys = tuple(key for key, kind in zip(keys, kinds) if kind == "extra")
+
+
+_layouts = {}
+
+
+def _shared_layout(keys, kinds):
+    layout = _layouts.get((keys, kinds))
+    if layout is None:
+        layout = _layouts[(keys, kinds)] = Layout(keys, kinds)
+    return layout
+
+
+class UserRecord:
+    """
+    Compact stand-in for a user dictionary.
+
+    Only the fields the pipeline works with get typed slots: an interned
+    handle, the username, last_price as a number and createdOn as epoch
+    milliseconds. Every other key is kept in a tuple whose key names live in
+    a Layout shared by all records of the same shape, so to_dict() returns
+    exactly the dictionary from_dict() was given. Values that can't be
+    converted losslessly (a non-canonical createdOn, a non-numeric price)
+    are kept verbatim.
+
+    Records read like a read-only dictionary (get, [], in, keys, items), and
+    fastJson encodes them as their dictionary, so they can be held in place
+    of the API's dicts and written out unchanged.
+    """
+
+    __slots__ = ("twitter_handle", "twitter_username", "last_price", "created_on_ms", "_extras", "_layout")
+
+    def __init__(self, twitter_handle, twitter_username, last_price, created_on_ms, extras, layout):
+        self.twitter_handle = twitter_handle
+        self.twitter_username = twitter_username
+        self.last_price = last_price
+        self.created_on_ms = created_on_ms
+        self._extras = extras
+        self._layout = layout
+
+    @classmethod
+    def from_dict(cls, user):
+        """Build a record from an API/JSON user dictionary"""
+        handle = username = price = created_on_ms = None
+        kinds = []
+        extras = []
+        for key, value in user.items():
+            kind = "extra"
+            if key == HANDLE and isinstance(value, str):
+                handle, kind = sys.intern(value), "handle"
+            elif key == USERNAME:
+                username, kind = value, "username"
+            elif key == LAST_PRICE:
+                if value is None or type(value) in (int, float):
+                    price, kind = value, "price"
+                elif isinstance(value, str):
+                    try:
+                        number = float(value)
+                    except ValueError:
+                        number = None
+                    if number is not None and repr(number) == value:
+                        price, kind = number, "price_str"
+            elif key == CREATED_ON:
+                ms = parse_created_on(value)
+                if value is None or ms is not None:
+                    created_on_ms, kind = ms, "created"
+            kinds.append(kind)
+            if kind == "extra":
+                extras.append(value)
+        layout = _shared_layout(tuple(user), tuple(kinds))
+        return cls(handle, username, price, created_on_ms, tuple(extras), layout)
+
+    def to_dict(self):
+        """The original JSON dictionary, key order and value types included"""
+        extras = iter(self._extras)
+        result = {}
+        for key, kind in zip(self._layout.keys, self._layout.kinds):
+            if kind == "extra":
+                result[key] = next(extras)
+            elif kind == "handle":
+                result[key] = self.twitter_handle
+            elif kind == "username":
+                result[key] = self.twitter_username
+            elif kind == "price":
+                result[key] = self.last_price
+            elif kind == "price_str":
+                result[key] = repr(self.last_price)
+            else:
+                result[key] = None if self.created_on_ms is None else format_created_on(self.created_on_ms)
+        return result
+
+    @property
+    def created_on(self):
+        """createdOn as the API's string (None if missing)"""
+        if self.created_on_ms is not None:
+            return format_created_on(self.created_on_ms)
+        return self.get(CREATED_ON)
+
+    def with_created_on(self, created_on):
+        """Copy of the record with createdOn set, appended as the last key if it was missing"""
+        ms = parse_created_on(created_on)
+        if self._layout.kind_of.get(CREATED_ON) == "created" and (ms is not None or created_on is None):
+            return UserRecord(self.twitter_handle, self.twitter_username, self.last_price, ms,
+                              self._extras, self._layout)
+        user = self.to_dict()
+        user[CREATED_ON] = created_on
+        return UserRecord.from_dict(user)
+
+    def get(self, key, default=None):
+        """dict.get-style access, so records can stand in for user dictionaries"""
+        kind = self._layout.kind_of.get(key)
+        if kind is None:
+            return default
+        if kind == "handle":
+            return self.twitter_handle
+        if kind == "username":
+            return self.twitter_username
+        if kind == "price":
+            return self.last_price
+        if kind == "price_str":
+            return repr(self.last_price)
+        if kind == "created":
+            return None if self.created_on_ms is None else format_created_on(self.created_on_ms)
+        return self._extras[self._layout.extra_keys.index(key)]
+
+    def __getitem__(self, key):
+        if key not in self._layout.kind_of:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key):
+        return key in self._layout.kind_of
+
+    def __iter__(self):
+        return iter(self._layout.keys)
+
+    def __len__(self):
+        return len(self._layout.keys)
+
+    def keys(self):
+        """The JSON keys in their original order, so dict(record) and {**record} work"""
+        return self._layout.keys
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __eq__(self, other):
+        return isinstance(other, UserRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()!r})"
@@ -0,0 +1,165 @@
+import json
+import os
+import fastJson
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonStream:
+    """Incremental tokenizer over a text file holding one JSON document"""
+
+    def __init__(self, f, chunk_size):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read another chunk, dropping text that has already been consumed"""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at EOF)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buffer, self._pos)
+        self._pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input until it fits"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal running to the end of the buffer may be cut short
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def _iter_entries(filename, key, chunk_size):
+    """
+    Yield (name, value, is_item) for each top-level entry of a JSON object.
+
+    The array stored under `key` is not materialized: each of its elements is
+    yielded on its own with is_item set.
+    """
+    with open(filename, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            name = stream.value()
+            stream.expect(":")
+            if name == key and stream.peek() == "[":
+                stream.expect("[")
+                if stream.peek() != "]":
+                    while True:
+                        yield name, stream.value(), True
+                        if stream.peek() != ",":
+                            break
+                        stream.expect(",")
+                stream.expect("]")
+            else:
+                yield name, stream.value(), False
+            if stream.peek() != ",":
+                break
+            stream.expect(",")
+        stream.expect("}")
+
+
+def iter_users(filename, key="users", chunk_size=1 << 16, columns=None):
+    """
+    Yield user records one at a time from a {"users": [...]} document.
+
+    Only one record (plus a read buffer) is held in memory at a time. If
+    filename is a columnar snapshot directory (see columnarStore), records
+    are rebuilt from its columns instead.
+
+    Args:
+        filename: Path of the JSON document or columnar snapshot
+        key: Name of the top-level array to stream
+        chunk_size: Number of characters read per chunk
+        columns: Fields to load from a columnar snapshot (default: all);
+            JSON documents always yield complete records
+    """
+    if os.path.isdir(filename):
+        from columnarStore import iter_column_users
+        yield from iter_column_users(filename, columns)
+        return
+    for _, value, is_item in _iter_entries(filename, key, chunk_size):
+        if is_item:
+            yield value
+
+
+def read_header(filename, key="users", chunk_size=1 << 16):
+    """
+    Return the top-level fields stored before the users array.
+
+    save_user_data and compact_journal write total_users and timestamp first,
+    so this stops at the first user without reading the rest of the file.
+    """
+    if os.path.isdir(filename):
+        from columnarStore import read_meta
+        return read_meta(filename)["header"]
+    header = {}
+    for name, value, is_item in _iter_entries(filename, key, chunk_size):
+        if is_item:
+            break
+        if name != key:
+            header[name] = value
+    return header
+
+
+def write_users(filename, header, users, key="users"):
+    """
+    Stream a {"users": [...]} document to disk, one record at a time.
+
+    The output matches json.dump(..., indent=2, ensure_ascii=False) and is
+    written through a temp file, so an interrupted run leaves the previous
+    file in place.
+
+    Returns:
+        int: Number of user records written
+    """
+    count = 0
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        f.write("{\n")
+        for name, value in header.items():
+            f.write(f"  {json.dumps(name, ensure_ascii=False)}: ")
+            f.write(json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            f.write(",\n")
+        f.write(f"  {json.dumps(key)}: [")
+        for user in users:
+            f.write(",\n    " if count else "\n    ")
+            f.write(fastJson.dumps_pretty(user).replace("\n", "\n    "))
+            count += 1
+        f.write("\n  ]\n}" if count else "]\n}")
+    os.replace(tmp_filename, filename)
+    return count